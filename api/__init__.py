@@ -7,9 +7,15 @@ from .auth import auth_routes
 from .profile import profile_routes
 from .quiz import quiz_routes
 from .leaderboard import leaderboard_routes
+from .search import search_routes
+from .export import export_routes
+from .rooms import room_routes
 
 api_bp.register_blueprint(weather_routes)
 api_bp.register_blueprint(auth_routes)
 api_bp.register_blueprint(profile_routes)
 api_bp.register_blueprint(quiz_routes)
-api_bp.register_blueprint(leaderboard_routes)
\ No newline at end of file
+api_bp.register_blueprint(leaderboard_routes)
+api_bp.register_blueprint(search_routes)
+api_bp.register_blueprint(export_routes)
+api_bp.register_blueprint(room_routes)
\ No newline at end of file
@@ -0,0 +1,417 @@
+"""
+Adaptive question selection using Elo ratings for players and questions.
+
+Every player and every question has a rating held in memory in flat
+arrays indexed by id. Answering updates both ratings online; a correct
+answer raises the player and lowers the question. Questions are bucketed by
+rating, so choosing the next question only looks at the buckets nearest the
+player's rating instead of scanning the bank.
+
+The state is rebuilt lazily on first use by replaying the scores table, and
+is local to the process. Each process applies its own answers at once and,
+every REFRESH_SECONDS, replays the attempts other processes have committed
+since, so the copies in several workers stay within a few seconds of each
+other.
+
+Database reads (the initial replay, a player's answered questions, the
+refresh) run outside the engine lock; the lock only guards the in-memory
+updates. Answered
+sets are kept for the MAX_CACHED_USERS most recent players, and a
+selection looks at no more than MAX_CANDIDATES questions: a player who has
+answered nearly everything nearby may be offered a repeat.
+"""
+import math
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from sqlalchemy import exists
+from sqlalchemy.orm import aliased
+from db.tables import db, Question, Score, ScoreSummary, QuestionStat
+from .question_cache import get_payload
+
+DEFAULT_RATING = 1500.0
+USER_K = 32.0
+QUESTION_K = 16.0
+BUCKET_WIDTH = 50.0
+# Aim slightly below the player's rating: about a 64% chance of success
+TARGET_OFFSET = -100.0
+RANDOM_PROBES = 8
+MAX_CANDIDATES = 1000
+MAX_CACHED_USERS = 10000
+REFRESH_SECONDS = 5.0
+
+SELECTION_MODES = ('random', 'adaptive')
+
+
+def expected_score(user_rating, question_rating):
+    """Probability that the player answers the question correctly"""
+    return 1.0 / (1.0 + 10 ** ((question_rating - user_rating) / 400.0))
+
+
+def _grow(values, size, fill):
+    if len(values) < size:
+        values.extend([fill] * (size - len(values)))
+
+
+class RatingEngine:
+    """In-memory Elo state and bucketed difficulty index"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        """Forget all state; it is rebuilt on next use"""
+        with self._lock:
+            self.loaded = False
+            self.user_ratings = array('d')
+            self.question_ratings = array('d')  # NaN marks ids with no question
+            self.buckets = {}                   # bucket -> list of question ids
+            self._bucket_of = {}                # question id -> bucket
+            self._position = {}                 # question id -> index in its bucket list
+            self.answered = OrderedDict()       # user id -> set of attempted question ids (LRU)
+            self.last_score_id = 0              # newest attempt included by the last replay
+            self._recorded = set()              # score ids above last_score_id already applied here
+            self._refreshed_at = time.monotonic()
+            self.generation += 1                # lets unlocked reads detect a reset
+
+    # -- difficulty index -------------------------------------------------
+
+    @staticmethod
+    def _bucket(rating):
+        return int(math.floor(rating / BUCKET_WIDTH))
+
+    def _index_question(self, question_id):
+        bucket = self._bucket(self.question_ratings[question_id])
+        if self._bucket_of.get(question_id) == bucket:
+            return
+        self._unindex_question(question_id)
+        members = self.buckets.setdefault(bucket, [])
+        self._position[question_id] = len(members)
+        members.append(question_id)
+        self._bucket_of[question_id] = bucket
+
+    def _unindex_question(self, question_id):
+        bucket = self._bucket_of.pop(question_id, None)
+        if bucket is None:
+            return
+        members = self.buckets[bucket]
+        index = self._position.pop(question_id)
+        last = members.pop()
+        if last != question_id:
+            members[index] = last
+            self._position[last] = index
+        if not members:
+            del self.buckets[bucket]
+
+    def add_question(self, question_id, rating=DEFAULT_RATING):
+        with self._lock:
+            _grow(self.question_ratings, question_id + 1, math.nan)
+            self.question_ratings[question_id] = rating
+            self._index_question(question_id)
+
+    def user_rating(self, user_id):
+        return self.user_ratings[user_id] if user_id < len(self.user_ratings) else DEFAULT_RATING
+
+    # -- loading ----------------------------------------------------------
+
+    def load(self, chunk_size=50000):
+        """
+        Build the state from the questions table and replay every attempt.
+        The replay fills a scratch engine without holding this one's lock;
+        the result is swapped in at the end, unless reset() ran meanwhile.
+        """
+        with self._lock:
+            generation = self.generation
+        scratch = RatingEngine()
+        scratch._replay(chunk_size)
+        with self._lock:
+            if self.generation != generation:
+                return
+            self.reset()
+            self.user_ratings, self.question_ratings = scratch.user_ratings, scratch.question_ratings
+            self.buckets, self._bucket_of, self._position = scratch.buckets, scratch._bucket_of, scratch._position
+            self.last_score_id = scratch.last_score_id
+            # Pick up the attempts committed during the replay on next use
+            self._refreshed_at = float('-inf')
+            self.loaded = True
+
+    def _replay(self, chunk_size):
+        initial = {
+            stat.question_id: stat.p_value
+            for stat in QuestionStat.query.filter(QuestionStat.p_value.isnot(None))
+        }
+        for (question_id,) in db.session.query(Question.id):
+            self.add_question(question_id, self._rating_from_p_value(initial.get(question_id)))
+        if not self.question_ratings:
+            return
+
+        seen = set()
+        # Compacted history first (see retention_service); it predates every score row
+        summaries = db.session.execute(
+            db.select(ScoreSummary.user_id, ScoreSummary.question_id, ScoreSummary.first_attempt_correct)
+            .order_by(ScoreSummary.first_attempt_at)
+            .execution_options(stream_results=True, yield_per=chunk_size)
+        )
+        for user_id, question_id, correct in summaries:
+            seen.add((user_id, question_id))
+            self._apply(user_id, question_id, correct)
+
+        rows = db.session.execute(
+            db.select(Score.id, Score.user_id, Score.question_id, Score.correct)
+            .order_by(Score.id)
+            .execution_options(stream_results=True, yield_per=chunk_size)
+        )
+        for score_id, user_id, question_id, correct in rows:
+            key = (user_id, question_id)
+            if key not in seen:
+                seen.add(key)
+                self._apply(user_id, question_id, correct)
+            self.last_score_id = score_id
+
+    @staticmethod
+    def _rating_from_p_value(p_value):
+        """Seed a question's rating from its measured p-value (see analytics_service)"""
+        if p_value is None:
+            return DEFAULT_RATING
+        p_value = min(max(p_value, 0.02), 0.98)
+        return DEFAULT_RATING + 400.0 * math.log10((1 - p_value) / p_value)
+
+    def ensure_loaded(self):
+        """Load on first use; concurrent callers wait for a single load"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.load()
+
+    def refresh(self, chunk_size=5000):
+        """Replay attempts committed since the last load or refresh (by any process)"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if not self.loaded:
+                    return
+                after, generation = self.last_score_id, self.generation
+                self._refreshed_at = time.monotonic()
+
+            earlier = aliased(Score)
+            first = ~exists().where(
+                earlier.user_id == Score.user_id, earlier.question_id == Score.question_id, earlier.id < Score.id
+            ) & ~exists().where(
+                ScoreSummary.user_id == Score.user_id, ScoreSummary.question_id == Score.question_id
+            )
+            while True:
+                rows = db.session.query(Score.id, Score.user_id, Score.question_id, Score.correct, first)\
+                    .filter(Score.id > after).order_by(Score.id).limit(chunk_size).all()
+                with self._lock:
+                    if self.generation != generation:
+                        return
+                    for score_id, user_id, question_id, correct, is_first in rows:
+                        if score_id in self._recorded:
+                            continue
+                        answered = self.answered.get(user_id)
+                        if answered is not None:
+                            answered.add(question_id)
+                        if is_first:
+                            self._apply(user_id, question_id, correct)
+                    if rows:
+                        after = self.last_score_id = max(self.last_score_id, rows[-1][0])
+                    self._recorded = {score_id for score_id in self._recorded if score_id > self.last_score_id}
+                if len(rows) < chunk_size:
+                    return
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_if_stale(self):
+        if self.loaded and time.monotonic() - self._refreshed_at >= REFRESH_SECONDS:
+            self.refresh()
+
+    # -- answered questions -----------------------------------------------
+
+    @staticmethod
+    def load_answered(user_ids, exclude_score_ids=()):
+        """Question ids each user has attempted, compacted or not; no engine lock needed"""
+        answered = {user_id: set() for user_id in user_ids}
+        ids = sorted(answered)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = db.session.query(Score.user_id, Score.question_id).filter(Score.user_id.in_(chunk))
+            if exclude_score_ids:
+                rows = rows.filter(Score.id.notin_(exclude_score_ids))
+            rows = rows.union(
+                db.session.query(ScoreSummary.user_id, ScoreSummary.question_id)
+                .filter(ScoreSummary.user_id.in_(chunk))
+            )
+            for user_id, question_id in rows:
+                answered[user_id].add(question_id)
+        return answered
+
+    def _cached_answered(self, user_id):
+        answered = self.answered.get(user_id)
+        if answered is not None:
+            self.answered.move_to_end(user_id)
+        return answered
+
+    def _cache_answered(self, user_id, answered):
+        """Keep a freshly loaded set, merged into one cached meanwhile; evicts the least recent player"""
+        cached = self.answered.get(user_id)
+        if cached is not None:
+            cached |= answered
+            self.answered.move_to_end(user_id)
+            return cached
+        self.answered[user_id] = answered
+        if len(self.answered) > MAX_CACHED_USERS:
+            self.answered.popitem(last=False)
+        return answered
+
+    def _answered(self, user_id):
+        """The player's answered set, loading it without holding the lock"""
+        with self._lock:
+            answered = self._cached_answered(user_id)
+            generation = self.generation
+        if answered is not None:
+            return answered
+        loaded = self.load_answered([user_id])[user_id]
+        with self._lock:
+            return self._cache_answered(user_id, loaded) if self.generation == generation else loaded
+
+    # -- updates ----------------------------------------------------------
+
+    def _apply(self, user_id, question_id, correct):
+        if question_id >= len(self.question_ratings) or math.isnan(self.question_ratings[question_id]):
+            return
+        _grow(self.user_ratings, user_id + 1, DEFAULT_RATING)
+        user_rating = self.user_ratings[user_id]
+        question_rating = self.question_ratings[question_id]
+        surprise = (1.0 if correct else 0.0) - expected_score(user_rating, question_rating)
+        self.user_ratings[user_id] = user_rating + USER_K * surprise
+        self.question_ratings[question_id] = question_rating - QUESTION_K * surprise
+        self._index_question(question_id)
+
+    def _needs_recording(self, score_id):
+        return self.loaded and (score_id is None or (score_id > self.last_score_id
+                                                     and score_id not in self._recorded))
+
+    def _record(self, user_id, question_id, correct, score_id, first):
+        answered = self.answered.get(user_id)
+        if answered is not None:
+            answered.add(question_id)
+        if score_id is not None:
+            self._recorded.add(score_id)
+        if first:
+            self._apply(user_id, question_id, correct)
+
+    def record_answer(self, user_id, question_id, correct, score_id=None):
+        """
+        Update ratings after an answer. Only a player's first attempt at a
+        question moves the ratings; attempts already replayed are ignored.
+        """
+        self.record_answers([(user_id, question_id, correct, score_id)])
+
+    def record_answers(self, answers):
+        """
+        record_answer() for a batch of (user_id, question_id, correct,
+        score_id) in score order, e.g. a room round: the answered sets of
+        players not cached yet are loaded with one query, outside the lock.
+        """
+        with self._lock:
+            if not any(self._needs_recording(score_id) for _, _, _, score_id in answers):
+                return
+            sets = {}
+            for user_id, _, _, _ in answers:
+                if user_id not in sets:
+                    sets[user_id] = self._cached_answered(user_id)
+            generation = self.generation
+
+        missing = [user_id for user_id, answered in sets.items() if answered is None]
+        if missing:
+            # The attempts being recorded are already committed; don't count them as history
+            loaded = self.load_answered(missing, [score_id for _, _, _, score_id in answers if score_id is not None])
+        with self._lock:
+            if self.generation != generation:
+                # Reloaded meanwhile: the reload has read these attempts
+                return
+            for user_id in missing:
+                sets[user_id] = self._cache_answered(user_id, loaded[user_id])
+            for user_id, question_id, correct, score_id in answers:
+                if not self._needs_recording(score_id):
+                    continue
+                answered = sets[user_id]
+                self._record(user_id, question_id, correct, score_id, question_id not in answered)
+                # The cached set may have been evicted since; keep later rows of this batch right
+                answered.add(question_id)
+        # Also bounds the ids kept in _recorded
+        self.refresh_if_stale()
+
+    # -- selection --------------------------------------------------------
+
+    def _pick(self, members, answered, budget):
+        """(unanswered question id or None, budget left); probes at random, then scans from a random offset"""
+        for _ in range(min(RANDOM_PROBES, budget)):
+            question_id = random.choice(members)
+            if question_id not in answered:
+                return question_id, budget - RANDOM_PROBES
+        budget -= RANDOM_PROBES
+        count = min(len(members), max(budget, 0))
+        offset = random.randrange(len(members))
+        for i in range(count):
+            question_id = members[(offset + i) % len(members)]
+            if question_id not in answered:
+                return question_id, budget - i - 1
+        return None, budget - count
+
+    def select_question_id(self, user_id):
+        """
+        Id of an unanswered question rated close to the player, searching
+        outward from the target bucket. After MAX_CANDIDATES questions, or
+        if all are answered, any question from the nearest bucket
+        """
+        answered = self._answered(user_id) if user_id else set()
+        with self._lock:
+            if not self.buckets:
+                return None
+            target = self._bucket(self.user_rating(user_id) + TARGET_OFFSET) if user_id else \
+                self._bucket(DEFAULT_RATING)
+
+            lowest, highest = min(self.buckets), max(self.buckets)
+            reach = max(target - lowest, highest - target)
+            fallback = None
+            budget = MAX_CANDIDATES
+            for distance in range(reach + 1):
+                for bucket in {target - distance, target + distance}:
+                    members = self.buckets.get(bucket)
+                    if not members:
+                        continue
+                    if fallback is None:
+                        fallback = random.choice(members)
+                    question_id, budget = self._pick(members, answered, budget)
+                    if question_id is not None:
+                        return question_id
+                    if budget <= 0:
+                        return fallback
+            return fallback
+
+
+rating_engine = RatingEngine()
+
+
+def get_adaptive_question(user_id):
+    """Payload of a question near the player's ability, or None if the bank is empty"""
+    rating_engine.ensure_loaded()
+    rating_engine.refresh_if_stale()
+    question_id = rating_engine.select_question_id(user_id)
+    if question_id is None:
+        return None
+
+    question = get_payload(question_id)
+    if question is None:
+        # The bank was reseeded under us; rebuild on next call
+        rating_engine.reset()
+    return question
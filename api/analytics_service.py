@@ -0,0 +1,285 @@
+"""
+Item analysis for the question bank: difficulty (p-value), point-biserial
+discrimination, distractor frequency and attempt counts per question.
+
+Attempts are loaded into NumPy arrays and reduced per question with
+bincount, so the cost is a few vectorized passes regardless of how many
+questions there are. Each run only reads Score rows above the high-water
+mark stored in JobState and folds them into the running sums kept in
+QuestionStat, so the job can be scheduled frequently.
+
+A player's ability is their total score when a run reads the attempt, so
+after incremental runs the ability sums mix scores taken at different
+times. Attempt counts, p-values and option picks are exact; discrimination
+is an approximation that drifts as players' scores grow. A full run
+(full=True) recomputes everything with current scores and is the
+reference; schedule one now and then.
+
+A full run also reads score_summaries, the attempts compacted by
+retention_service. Their chosen options are not kept, so they count as
+attempts without a recorded answer in the option picks.
+"""
+from datetime import datetime
+import numpy as np
+from sqlalchemy import case, insert, update
+from db.tables import db, User, Score, ScoreSummary, QuestionStat, JobState
+
+HIGH_WATER_MARK = 'item_analysis_score_id'
+ANSWER_CODES = {'a': 0, 'b': 1, 'c': 2, 'd': 3}
+
+# Running sums kept per question, in the order returned by compute_item_sums()
+SUM_COLUMNS = ['attempts', 'correct', 'sum_ability', 'sum_ability_sq', 'sum_correct_ability',
+               'picks_a', 'picks_b', 'picks_c', 'picks_d']
+
+
+def load_attempts(after_id=0, chunk_size=50000):
+    """
+    Load attempts with Score.id > after_id into NumPy arrays
+
+    A player's ability is their current total score.
+
+    Returns: dict of equally long arrays: score_id, question_id, correct,
+        answer (0-3, or -1 when the chosen option was not recorded) and ability
+    """
+    # Plain Core rows on the session's connection (no ORM row processing),
+    # with the answer already coded by SQLite
+    result = db.session.connection().execute(
+        db.select(Score.id, Score.question_id, Score.correct,
+                  case(ANSWER_CODES, value=Score.answer, else_=-1), User.total_score)
+        .join(User, User.id == Score.user_id)
+        .where(Score.id > after_id)
+        .order_by(Score.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+
+    chunks = []
+    for partition in result.partitions():
+        score_id, question_id, correct, answer, ability = zip(*partition)
+        chunks.append((
+            np.array(score_id, dtype=np.int64),
+            np.array(question_id, dtype=np.int64),
+            np.array(correct, dtype=bool),
+            np.array(answer, dtype=np.int8),
+            np.array(ability, dtype=np.float64),
+        ))
+
+    if not chunks:
+        return {
+            'score_id': np.empty(0, dtype=np.int64),
+            'question_id': np.empty(0, dtype=np.int64),
+            'correct': np.empty(0, dtype=bool),
+            'answer': np.empty(0, dtype=np.int8),
+            'ability': np.empty(0, dtype=np.float64),
+        }
+
+    names = ['score_id', 'question_id', 'correct', 'answer', 'ability']
+    return {name: np.concatenate([chunk[i] for chunk in chunks]) for i, name in enumerate(names)}
+
+
+def load_summaries(chunk_size=50000):
+    """
+    Load the compacted attempts in score_summaries into NumPy arrays
+
+    Returns: dict of equally long arrays, one entry per (user, question):
+        question_id, attempts, corrects and ability
+    """
+    result = db.session.connection().execute(
+        db.select(ScoreSummary.question_id, ScoreSummary.attempts, ScoreSummary.corrects, User.total_score)
+        .join(User, User.id == ScoreSummary.user_id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    columns = ([], [], [], [])
+    for partition in result.partitions():
+        for column, values in zip(columns, zip(*partition)):
+            column.extend(values)
+    question_id, attempts, corrects, ability = columns
+    return {
+        'question_id': np.array(question_id, dtype=np.int64),
+        'attempts': np.array(attempts, dtype=np.int64),
+        'corrects': np.array(corrects, dtype=np.int64),
+        'ability': np.array(ability, dtype=np.float64),
+    }
+
+
+def compute_item_sums(question_id, correct, answer, ability, count=None):
+    """
+    Reduce attempt arrays to per-question running sums
+
+    With `count`, each row stands for `count` attempts by one player, of
+    which `correct` were correct (answer -1 when not recorded).
+
+    Returns: (question_ids, sums) where sums has one row per question and
+        one column per entry of SUM_COLUMNS
+    """
+    # Question ids are dense autoincrement keys, so index by offset instead
+    # of sorting (np.unique) and drop the empty slots afterwards
+    offset = int(question_id.min())
+    index = question_id - offset
+    size = int(index.max()) + 1
+    x = correct.astype(np.float64)
+
+    sums = np.empty((size, len(SUM_COLUMNS)), dtype=np.float64)
+    if count is None:
+        sums[:, 0] = np.bincount(index, minlength=size)
+        sums[:, 2] = np.bincount(index, weights=ability, minlength=size)
+        sums[:, 3] = np.bincount(index, weights=ability * ability, minlength=size)
+    else:
+        weighted = count * ability
+        sums[:, 0] = np.bincount(index, weights=count, minlength=size)
+        sums[:, 2] = np.bincount(index, weights=weighted, minlength=size)
+        sums[:, 3] = np.bincount(index, weights=weighted * ability, minlength=size)
+    sums[:, 1] = np.bincount(index, weights=x, minlength=size)
+    sums[:, 4] = np.bincount(index, weights=x * ability, minlength=size)
+
+    # One bincount over (question, option) pairs for all four options at once
+    recorded = answer >= 0
+    picks = np.bincount(index[recorded] * 4 + answer[recorded], minlength=size * 4)
+    sums[:, 5:9] = picks.reshape(size, 4)
+
+    present = sums[:, 0] > 0
+    return np.flatnonzero(present) + offset, sums[present]
+
+
+def derive_item_statistics(sums):
+    """
+    Compute p-value and point-biserial discrimination from running sums
+
+    Returns: (p_value, discrimination) arrays; NaN where undefined (no
+        attempts, or no variance in correctness or ability)
+    """
+    n, sx, st, stt, sxt = (sums[:, i] for i in range(5))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_value = sx / n
+        covariance = n * sxt - sx * st
+        variance = (n * sx - sx * sx) * (n * stt - st * st)
+        discrimination = np.where(variance > 0, covariance / np.sqrt(variance), np.nan)
+    return p_value, discrimination
+
+
+def _get_high_water_mark():
+    state = db.session.get(JobState, HIGH_WATER_MARK)
+    return state.value if state else 0
+
+
+def _set_high_water_mark(value):
+    state = db.session.get(JobState, HIGH_WATER_MARK)
+    if state is None:
+        state = JobState(name=HIGH_WATER_MARK)
+        db.session.add(state)
+    state.value = value
+
+
+def _load_existing_sums(question_ids, batch_size=500):
+    """Running sums already stored for these questions, keyed by question_id"""
+    existing = {}
+    for start in range(0, len(question_ids), batch_size):
+        batch = [int(q) for q in question_ids[start:start + batch_size]]
+        for stat in QuestionStat.query.filter(QuestionStat.question_id.in_(batch)):
+            existing[stat.question_id] = [getattr(stat, column) for column in SUM_COLUMNS]
+    return existing
+
+
+def _optional_float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def run_item_analysis(full=False, chunk_size=50000):
+    """
+    Fold new attempts into the question_stats table
+
+    Args:
+        full: Discard stored statistics and recompute from every Score row
+            and every compacted attempt in score_summaries, with current
+            abilities
+        chunk_size: Rows fetched per database round trip
+
+    Returns:
+        Dictionary with the number of attempts processed, questions updated
+        and the new high-water mark
+    """
+    previous_mark = _get_high_water_mark()
+    after_id = 0 if full else previous_mark
+
+    attempts = load_attempts(after_id, chunk_size)
+    question_id, correct, answer, ability = (
+        attempts['question_id'], attempts['correct'], attempts['answer'], attempts['ability']
+    )
+    count = None
+    processed = len(question_id)
+    if full:
+        QuestionStat.query.delete()
+        summaries = load_summaries(chunk_size)
+        if len(summaries['question_id']):
+            question_id = np.concatenate([question_id, summaries['question_id']])
+            correct = np.concatenate([correct.astype(np.int64), summaries['corrects']])
+            answer = np.concatenate([answer, np.full(len(summaries['question_id']), -1, dtype=np.int8)])
+            ability = np.concatenate([ability, summaries['ability']])
+            count = np.concatenate([np.ones(processed, dtype=np.int64), summaries['attempts']])
+            processed += int(summaries['attempts'].sum())
+
+    if len(question_id) == 0:
+        db.session.commit()
+        return {'processed': 0, 'questions_updated': 0, 'high_water_mark': previous_mark}
+
+    question_ids, sums = compute_item_sums(question_id, correct, answer, ability, count)
+
+    existing = {} if full else _load_existing_sums(question_ids)
+    is_existing = np.array([int(q) in existing for q in question_ids], dtype=bool)
+    if is_existing.any():
+        sums[is_existing] += np.array([existing[int(q)] for q in question_ids[is_existing]])
+
+    p_value, discrimination = derive_item_statistics(sums)
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for i, question_id in enumerate(question_ids):
+        row = {column: sums[i, j] for j, column in enumerate(SUM_COLUMNS)}
+        for column in ('attempts', 'correct', 'picks_a', 'picks_b', 'picks_c', 'picks_d'):
+            row[column] = int(row[column])
+        row.update(
+            question_id=int(question_id),
+            p_value=_optional_float(p_value[i]),
+            discrimination=_optional_float(discrimination[i]),
+            updated_at=now
+        )
+        (updates if is_existing[i] else inserts).append(row)
+
+    if inserts:
+        db.session.execute(insert(QuestionStat), inserts)
+    if updates:
+        db.session.execute(update(QuestionStat), updates)
+
+    # Compacted attempts are all at or below the previous mark
+    high_water_mark = max(int(attempts['score_id'].max()) if len(attempts['score_id']) else 0, previous_mark)
+    _set_high_water_mark(high_water_mark)
+    db.session.commit()
+
+    return {
+        'processed': processed,
+        'questions_updated': len(question_ids),
+        'high_water_mark': high_water_mark
+    }
+
+
+def get_item_statistics():
+    """
+    Stored statistics for every analysed question, hardest first
+    Returns: list of dicts with difficulty, discrimination and the share of
+        recorded answers that picked each option
+    """
+    stats = QuestionStat.query.order_by(QuestionStat.p_value.asc()).all()
+    result = []
+    for stat in stats:
+        picks = {'a': stat.picks_a, 'b': stat.picks_b, 'c': stat.picks_c, 'd': stat.picks_d}
+        recorded = sum(picks.values())
+        result.append({
+            'question_id': stat.question_id,
+            'attempts': stat.attempts,
+            'p_value': stat.p_value,
+            'discrimination': stat.discrimination,
+            'option_frequency': {
+                option: round(count / recorded, 4) if recorded else None
+                for option, count in picks.items()
+            }
+        })
+    return result
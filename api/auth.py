@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify, session
+import csrf
 from .auth_service import authenticate_user, register_user
 
 auth_routes = Blueprint('auth', __name__)
@@ -57,7 +58,7 @@ def login():
 def logout():
     """User logout endpoint with CSRF protection"""
     token = request.headers.get('X-CSRF-Token')
-    if not token or token != session.get('csrf_token'):
+    if not csrf.token_matches(token):
         return jsonify({'error': 'Invalid CSRF token'}), 403
 
     session.clear()
@@ -1,6 +1,7 @@
 """Authentication business logic - shared between API and web routes"""
 from werkzeug.security import check_password_hash
 from db.tables import db, User
+from . import fragment_cache
 from flask import session
 import bleach
 
@@ -64,7 +65,9 @@ def register_user(username, nickname, password, confirm_password):
     try:
         db.session.add(new_user)
         db.session.commit()
-        return True, None, new_user
     except Exception:
         db.session.rollback()
         return False, 'Registration failed', None
+
+    fragment_cache.invalidate_leaderboard_tail()
+    return True, None, new_user
@@ -0,0 +1,41 @@
+"""Admin endpoints for bulk data export"""
+from datetime import datetime
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from api.export_service import export_scores, EXPORT_FORMATS
+from api.services import is_admin_request
+
+
+export_routes = Blueprint('export_routes', __name__)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+@export_routes.route('/admin/scores/export', methods=['GET'])
+def api_export_scores():
+    """Stream quiz attempts as CSV or NDJSON (admin only)"""
+    if not is_admin_request(request):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+
+    try:
+        since = _parse_datetime(request.args.get('since'))
+        until = _parse_datetime(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO-8601 datetimes'}), 400
+
+    chunks = export_scores(fmt, since=since, until=until, nickname=request.args.get('user'))
+
+    response = Response(stream_with_context(chunks), content_type=CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=scores.{fmt}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
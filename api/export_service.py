@@ -0,0 +1,90 @@
+"""Streaming export of quiz attempts for offline analysis"""
+import csv
+import io
+import json
+from db.tables import db, User, Score
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ['score_id', 'user_id', 'nickname', 'question_id', 'correct', 'points', 'timestamp']
+
+
+def iter_score_rows(since=None, until=None, nickname=None, chunk_size=1000):
+    """
+    Yield Score rows joined with the player's nickname, oldest first
+
+    Rows are fetched through a streaming cursor `chunk_size` at a time, so
+    memory use does not depend on the size of the scores table.
+
+    Args:
+        since: Only attempts at or after this datetime
+        until: Only attempts before this datetime
+        nickname: Only attempts by this player
+        chunk_size: Rows buffered per fetch
+    """
+    query = db.session.query(
+        Score.id, Score.user_id, User.nickname, Score.question_id,
+        Score.correct, Score.points, Score.timestamp
+    ).join(User, User.id == Score.user_id)
+
+    if since:
+        query = query.filter(Score.timestamp >= since)
+    if until:
+        query = query.filter(Score.timestamp < until)
+    if nickname:
+        query = query.filter(User.nickname == nickname)
+
+    query = query.order_by(Score.id).execution_options(stream_results=True, yield_per=chunk_size)
+
+    for row in query:
+        yield {
+            'score_id': row.id,
+            'user_id': row.user_id,
+            'nickname': row.nickname,
+            'question_id': row.question_id,
+            'correct': row.correct,
+            'points': row.points,
+            'timestamp': row.timestamp.isoformat()
+        }
+
+
+def _batched(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows, batch_size=500):
+    """Encode rows as CSV text chunks (header first), batch_size rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for batch in _batched(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows, batch_size=500):
+    """Encode rows as newline-delimited JSON chunks, batch_size rows per chunk"""
+    for batch in _batched(rows, batch_size):
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in batch)
+
+
+def export_scores(fmt='csv', since=None, until=None, nickname=None, chunk_size=1000):
+    """
+    Stream the scores table as text chunks
+    Returns: generator of str chunks in the requested format
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {fmt}')
+
+    rows = iter_score_rows(since, until, nickname, chunk_size)
+    return iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows)
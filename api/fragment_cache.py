@@ -0,0 +1,248 @@
+"""
+Cache of rendered template fragments, kept in each worker process.
+
+Each fragment belongs to a scope, e.g. ('profile', user_id) or
+('leaderboard', per_page, page), and is stored under (scope, version).
+Writers bump the version of the scopes they change, so a render that raced
+with an update is stored under a version nobody asks for any more.
+
+Leaderboard pages remember the score range and users they show.
+A score change from `old` to `new` reorders only players scoring between
+the two, so invalidate_leaderboard_scores() bumps just the pages that show
+a score in that range. Nickname changes bump the page that shows the user,
+and registrations bump the partial last page.
+
+Invalidations reach the other workers through the fragment_invalidations
+table. Each one is applied locally and logged in its own short
+transaction; batch() logs several as one entry. Before serving from its
+cache, a worker replays the entries it has not seen yet, at most once
+every SYNC_SECONDS. A fragment also expires after FRAGMENT_TTL seconds.
+A scope invalidated less than REPLICA_LAG_SECONDS ago is rendered from the
+primary database, so a lagging read replica cannot cache old data under
+the new version.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert
+from sqlalchemy.exc import SQLAlchemyError
+from db.tables import db, FragmentInvalidation
+from db.config import reads_from_primary
+
+MAX_FRAGMENTS = 2000
+FRAGMENT_TTL = 300.0
+SYNC_SECONDS = 1.0
+REPLICA_LAG_SECONDS = 10.0
+LOG_RETENTION = timedelta(hours=1)
+PRUNE_SECONDS = 600.0
+
+_fragments = OrderedDict()  # (scope, version) -> (html, stored at)
+_versions = {}
+_invalidated_at = {}        # scope -> when its version was last bumped
+# scope -> (version, lowest score, highest score, user ids, page is full)
+_leaderboard_pages = {}
+_lock = threading.Lock()
+
+_sync_lock = threading.Lock()
+_last_seen = None           # newest log entry applied here (None: not synced yet)
+_synced_at = float('-inf')
+_pruned_at = float('-inf')
+_own_entries = set()        # log entries written here, already applied
+_batch = threading.local()
+
+
+def get_fragment(scope, render):
+    """Return the cached fragment for scope, calling render() to build it on a miss"""
+    _sync()
+    now = time.monotonic()
+    with _lock:
+        version = _versions.get(scope, 0)
+        cached = _fragments.get((scope, version))
+        if cached is not None and now - cached[1] < FRAGMENT_TTL:
+            _fragments.move_to_end((scope, version))
+            return cached[0]
+        recently_invalidated = now - _invalidated_at.get(scope, float('-inf')) < REPLICA_LAG_SECONDS
+
+    if recently_invalidated:
+        with reads_from_primary():
+            html = render()
+    else:
+        html = render()
+
+    with _lock:
+        if _versions.get(scope, 0) == version:
+            _fragments[(scope, version)] = (html, now)
+            _fragments.move_to_end((scope, version))
+            if len(_fragments) > MAX_FRAGMENTS:
+                _fragments.popitem(last=False)
+    return html
+
+
+def invalidate(*scopes):
+    """Bump the version of each scope, dropping its cached fragment"""
+    _record([['scope', list(scope)] for scope in scopes])
+
+
+def _bump(scope):
+    version = _versions.get(scope, 0)
+    _fragments.pop((scope, version), None)
+    _versions[scope] = version + 1
+    _invalidated_at[scope] = time.monotonic()
+    _leaderboard_pages.pop(scope, None)
+
+
+def leaderboard_scope(page, per_page):
+    return ('leaderboard', per_page, page)
+
+
+def track_leaderboard_page(page, per_page, entries):
+    """Record which scores and users a leaderboard page fragment shows"""
+    scope = leaderboard_scope(page, per_page)
+    scores = [entry['score'] for entry in entries]
+    with _lock:
+        _leaderboard_pages[scope] = (
+            _versions.get(scope, 0),
+            min(scores, default=None),
+            max(scores, default=None),
+            frozenset(entry['user_id'] for entry in entries),
+            len(entries) == per_page,
+        )
+
+
+def _invalidate_leaderboard_pages(affected):
+    with _lock:
+        for scope, (version, low, high, user_ids, full) in list(_leaderboard_pages.items()):
+            if _versions.get(scope, 0) == version and affected(low, high, user_ids, full):
+                _bump(scope)
+
+
+def invalidate_leaderboard_scores(old_score, new_score):
+    """A user's total moved between old_score and new_score"""
+    _record([['scores', min(old_score, new_score), max(old_score, new_score)]])
+
+
+def invalidate_leaderboard_user(user_id):
+    """A user's displayed details (nickname) changed"""
+    _record([['user', user_id]])
+
+
+def invalidate_leaderboard_tail():
+    """A new player joined at the bottom of the leaderboard"""
+    _record([['tail']])
+
+
+def _apply(event):
+    kind = event[0]
+    if kind == 'scope':
+        with _lock:
+            _bump(tuple(event[1]))
+    elif kind == 'scores':
+        low, high = event[1], event[2]
+        _invalidate_leaderboard_pages(
+            lambda page_low, page_high, user_ids, full: page_low is not None and page_low <= high and page_high >= low
+        )
+    elif kind == 'user':
+        _invalidate_leaderboard_pages(lambda low, high, user_ids, full: event[1] in user_ids)
+    elif kind == 'tail':
+        _invalidate_leaderboard_pages(lambda low, high, user_ids, full: not full)
+    elif kind == 'clear':
+        _clear_local()
+
+
+def _record(events):
+    """Apply invalidations here and log them for the other workers"""
+    for event in events:
+        _apply(event)
+    pending = getattr(_batch, 'events', None)
+    if pending is not None:
+        pending.extend(events)
+    else:
+        _publish(events)
+
+
+@contextmanager
+def batch():
+    """Log the invalidations made inside the block as one entry (one write for a batch of answers)"""
+    if getattr(_batch, 'events', None) is not None:
+        yield
+        return
+    _batch.events = []
+    try:
+        yield
+    finally:
+        events, _batch.events = _batch.events, None
+        if events:
+            _publish(events)
+
+
+def _publish(events):
+    try:
+        with db.engine.begin() as conn:
+            entry_id = conn.execute(
+                insert(FragmentInvalidation).values(events=json.dumps(events), created_at=datetime.utcnow())
+            ).inserted_primary_key[0]
+    except SQLAlchemyError as e:
+        print(f"Could not log fragment invalidation; other workers expire it within {FRAGMENT_TTL:.0f}s: {e}")
+        return
+    with _lock:
+        _own_entries.add(entry_id)
+
+
+def _sync():
+    """Replay invalidations logged by other workers since the last sync"""
+    global _last_seen, _synced_at, _pruned_at
+    now = time.monotonic()
+    if now - _synced_at < SYNC_SECONDS or not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        idle = now - _synced_at
+        _synced_at = now
+        if _last_seen is None or idle > LOG_RETENTION.total_seconds() / 2:
+            # First use, or idle long enough to miss pruned entries: start over from the newest entry
+            latest = db.session.query(func.max(FragmentInvalidation.id)).scalar() or 0
+            if _last_seen is not None:
+                _clear_local()
+            _last_seen = latest
+        else:
+            entries = db.session.query(FragmentInvalidation.id, FragmentInvalidation.events)\
+                .filter(FragmentInvalidation.id > _last_seen).order_by(FragmentInvalidation.id).all()
+            for entry_id, events in entries:
+                with _lock:
+                    own = entry_id in _own_entries
+                if not own:
+                    for event in json.loads(events):
+                        _apply(event)
+            if entries:
+                _last_seen = entries[-1][0]
+        with _lock:
+            _own_entries.difference_update([entry_id for entry_id in _own_entries if entry_id <= _last_seen])
+
+        if now - _pruned_at >= PRUNE_SECONDS:
+            _pruned_at = now
+            with db.engine.begin() as conn:
+                conn.execute(delete(FragmentInvalidation).where(
+                    FragmentInvalidation.created_at < datetime.utcnow() - LOG_RETENTION
+                ))
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"Fragment cache sync failed: {e}")
+    finally:
+        _sync_lock.release()
+
+
+def _clear_local():
+    now = time.monotonic()
+    with _lock:
+        for scope in set(_versions) | {scope for scope, _ in _fragments}:
+            _versions[scope] = _versions.get(scope, 0) + 1
+            _invalidated_at[scope] = now
+        _fragments.clear()
+        _leaderboard_pages.clear()
+
+
+def clear():
+    """Drop every cached fragment in every worker, e.g. after bulk score changes from manage.py"""
+    _record([['clear']])
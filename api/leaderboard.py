@@ -6,7 +6,7 @@ from api.leaderboard_service import get_leaderboard
 leaderboard_routes = Blueprint('leaderboard_routes', __name__)
 
 
-@leaderboard_routes.route('/api/leaderboard', methods=['GET'])
+@leaderboard_routes.route('/leaderboard', methods=['GET'])
 def api_leaderboard():
     """Get leaderboard with users by score (paginated)"""
     page = request.args.get('page', 1, type=int)
@@ -1,44 +1,63 @@
 """Service for leaderboard operations"""
+import math
+from sqlalchemy import func
 from db.tables import db, User
+from db.config import get_read_session
 
 
-def get_leaderboard(page=1, per_page=50):
+def get_leaderboard_entries(page=1, per_page=50):
     """
-    Get users by total score with pagination
+    Get one page of users ordered by total score (ties: earliest registration first)
     
     Args:
         page: Page number (1-indexed)
-        per_page: Number of users per page (default 50)
+        per_page: Number of users per page
     
     Returns:
-        Dictionary with leaderboard data and pagination info
+        List of dictionaries with rank, nickname, score and user_id
     """
-    pagination = User.query.order_by(User.total_score.desc()).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
-    )
+    users = get_read_session().query(User).order_by(User.total_score.desc(), User.id)\
+        .offset((page - 1) * per_page)\
+        .limit(per_page)\
+        .all()
     
     # Calculate starting rank for this page
     start_rank = (page - 1) * per_page + 1
     
-    leaderboard = []
-    for idx, user in enumerate(pagination.items):
-        leaderboard.append({
+    return [
+        {
             'rank': start_rank + idx,
             'nickname': user.nickname,
             'score': user.total_score,
             'user_id': user.id
-        })
+        }
+        for idx, user in enumerate(users)
+    ]
+
+
+def get_leaderboard(page=1, per_page=50, include_entries=True):
+    """
+    Get users by total score with pagination
+    
+    Args:
+        page: Page number (1-indexed)
+        per_page: Number of users per page (default 50)
+        include_entries: Skip the page query when False (leaderboard is None)
+    
+    Returns:
+        Dictionary with leaderboard data and pagination info
+    """
+    total = get_read_session().query(func.count(User.id)).scalar()
+    total_pages = math.ceil(total / per_page) if total else 0
     
     return {
-        'leaderboard': leaderboard,
-        'total': pagination.total,
+        'leaderboard': get_leaderboard_entries(page, per_page) if include_entries else None,
+        'total': total,
         'page': page,
         'per_page': per_page,
-        'total_pages': pagination.pages,
-        'has_prev': pagination.has_prev,
-        'has_next': pagination.has_next
+        'total_pages': total_pages,
+        'has_prev': page > 1,
+        'has_next': page < total_pages
     }
 
 
@@ -52,12 +71,13 @@ def get_user_rank(user_id):
     Returns:
         Dictionary with rank and user info, or None if user not found
     """
-    user = User.query.get(user_id)
+    session = get_read_session()
+    user = session.get(User, user_id)
     if not user:
         return None
     
     # Count users with higher score
-    higher_count = User.query.filter(User.total_score > user.total_score).count()
+    higher_count = session.query(User).filter(User.total_score > user.total_score).count()
     rank = higher_count + 1
     
     return {
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify, session
-from .profile_service import get_user_profile, update_user_profile
+from .profile_service import get_user_profile, update_user_profile, get_activity, ACTIVITY_PAGE_SIZE
 
 profile_routes = Blueprint('profile', __name__)
 
@@ -19,6 +19,22 @@ def get_profile():
         return jsonify({'error': error}), status_code
 
 
+@profile_routes.route('/profile/activity', methods=['GET'])
+def get_profile_activity():
+    """Quiz attempt history for the current user, newest first (?cursor=&limit=)"""
+    user_id = session.get('user_id')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', ACTIVITY_PAGE_SIZE, type=int)
+    
+    success, error, activity = get_activity(user_id, cursor=cursor, limit=limit)
+    
+    if success:
+        return jsonify(activity), 200
+    else:
+        status_code = 401 if error == 'Unauthorized' else 400
+        return jsonify({'error': error}), status_code
+
+
 @profile_routes.route('/profile/update', methods=['POST'])
 def update_profile():
     """Update user profile information"""
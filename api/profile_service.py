@@ -1,8 +1,16 @@
 """Profile business logic - shared between API and web routes"""
-from db.tables import db, User, Score
-from sqlalchemy import func
+from datetime import datetime
+from sqlalchemy import tuple_
+from db.tables import db, User, Score, Question
+from db.config import get_read_session
+from .retention_service import attempt_totals
+from . import fragment_cache
 from flask import session
 import bleach
+import csrf
+
+ACTIVITY_PAGE_SIZE = 20
+MAX_ACTIVITY_PAGE_SIZE = 100
 
 
 def get_user_profile(user_id=None, nickname=None):
@@ -11,7 +19,7 @@ def get_user_profile(user_id=None, nickname=None):
     Returns: (success: bool, error_message: str or None, profile_data: dict or None)
     """
     if nickname:
-        user = User.query.filter_by(nickname=nickname).first()
+        user = get_read_session().query(User).filter_by(nickname=nickname).first()
         if not user:
             return False, 'User not found', None
         
@@ -31,16 +39,12 @@ def get_user_profile(user_id=None, nickname=None):
     if not user:
         return False, 'User not found', None
     
-    total_quizzes = len(user.scores)
+    total_quizzes, total_points = attempt_totals(user_id)
     average_score = 0
     if total_quizzes > 0:
-        total_points = db.session.query(func.sum(Score.points)).filter_by(user_id=user_id).scalar() or 0
         average_score = round(total_points / total_quizzes, 1)
     
-    recent_quizzes = Score.query.filter_by(user_id=user_id)\
-        .order_by(Score.timestamp.desc())\
-        .limit(10)\
-        .all()
+    recent_quizzes, _ = _activity_page(user_id, None, 10)
     
     return True, None, {
         'username': user.username,
@@ -49,15 +53,69 @@ def get_user_profile(user_id=None, nickname=None):
         'average_score': average_score,
         'total_quizzes': total_quizzes,
         'created_at': user.created_at.isoformat() if user.created_at else None,
-        'quizzes': [
-            {
-                'question_id': quiz.question_id,
-                'points': quiz.points,
-                'correct': quiz.correct,
-                'timestamp': quiz.timestamp.isoformat()
-            }
-            for quiz in recent_quizzes
-        ]
+        'quizzes': recent_quizzes
+    }
+
+
+def _activity_page(user_id, after, limit):
+    """Attempts older than the (timestamp, id) key `after`, newest first, plus the key of the last one if more exist"""
+    query = db.session.query(
+        Score.id, Score.question_id, Score.correct, Score.answer, Score.points, Score.timestamp, Question.prompt
+    ).outerjoin(Question, Question.id == Score.question_id).filter(Score.user_id == user_id)
+    if after is not None:
+        query = query.filter(tuple_(Score.timestamp, Score.id) < tuple_(*after))
+    rows = query.order_by(Score.timestamp.desc(), Score.id.desc()).limit(limit + 1).all()
+    
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            'question_id': row.question_id,
+            'prompt': row.prompt,
+            'answer': row.answer,
+            'points': row.points,
+            'correct': row.correct,
+            'timestamp': row.timestamp.isoformat()
+        }
+        for row in rows
+    ]
+    return items, (rows[-1].timestamp, rows[-1].id) if more else None
+
+
+def _encode_cursor(key):
+    timestamp, score_id = key
+    return f'{timestamp.isoformat()}_{score_id}'
+
+
+def _decode_cursor(cursor):
+    timestamp, _, score_id = cursor.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(score_id)
+
+
+def get_activity(user_id, cursor=None, limit=ACTIVITY_PAGE_SIZE):
+    """
+    One page of the user's quiz attempts, newest first, with each question's prompt
+    Pages by keyset on (timestamp, id): pass the returned next_cursor to get the
+    next page, until it is None. Attempts folded into score summaries are not listed.
+    Returns: (success: bool, error_message: str or None, data: dict or None)
+    """
+    if not user_id:
+        return False, 'Unauthorized', None
+    
+    if not 1 <= limit <= MAX_ACTIVITY_PAGE_SIZE:
+        return False, f'limit must be between 1 and {MAX_ACTIVITY_PAGE_SIZE}', None
+    
+    after = None
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except ValueError:
+            return False, 'Invalid cursor', None
+    
+    items, last = _activity_page(user_id, after, limit)
+    return True, None, {
+        'items': items,
+        'next_cursor': _encode_cursor(last) if last else None
     }
 
 
@@ -69,7 +127,7 @@ def update_user_profile(user_id, nickname, csrf_token):
     if not user_id:
         return False, 'Unauthorized'
     
-    if not csrf_token or csrf_token != session.get('csrf_token'):
+    if not csrf.token_matches(csrf_token):
         return False, 'Invalid CSRF token'
     
     user = User.query.get(user_id)
@@ -89,7 +147,11 @@ def update_user_profile(user_id, nickname, csrf_token):
     
     try:
         db.session.commit()
-        return True, None
     except Exception:
         db.session.rollback()
         return False, 'Failed to update profile'
+
+    with fragment_cache.batch():
+        fragment_cache.invalidate_leaderboard_user(user_id)
+        fragment_cache.invalidate(('profile', user_id))
+    return True, None
@@ -0,0 +1,94 @@
+"""
+Pre-serialized question payloads.
+
+Questions only change when the bank is reseeded, so each one is
+serialized once: the /api/quiz/question JSON body (bytes) and the answer
+options markup on /quiz (_quiz_options.html). Serving a question then needs
+neither an ORM object nor another json.dumps or template render.
+
+Entries are keyed by (question id, seed version). seed_questions.py bumps
+the version in job_state after a reseed, which may reuse ids. Each worker
+reads the version at most once every SEED_VERSION_TTL seconds, so it
+drops its old payloads within a second of a reseed.
+The correct option is never part of a payload.
+"""
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, render_template
+from markupsafe import Markup
+from db.tables import db, Question, JobState
+
+SEED_VERSION = 'question_seed_version'
+SEED_VERSION_TTL = 1.0
+
+QuestionPayload = namedtuple('QuestionPayload', ['id', 'prompt', 'json', 'options_html'])
+
+_payloads = {}
+_version = None
+_version_checked_at = float('-inf')
+_lock = threading.Lock()
+
+
+def seed_version():
+    """Current question bank version (0 until the first reseed)"""
+    return db.session.query(JobState.value).filter_by(name=SEED_VERSION).scalar() or 0
+
+
+def bump_seed_version():
+    """Mark the question bank as changed; call after reseeding, before committing"""
+    state = db.session.get(JobState, SEED_VERSION)
+    if state is None:
+        state = JobState(name=SEED_VERSION, value=0)
+        db.session.add(state)
+    state.value += 1
+
+
+def _build(row):
+    question_id, prompt, option_a, option_b, option_c, option_d = row
+    options = {'a': option_a, 'b': option_b, 'c': option_c, 'd': option_d}
+    # The exact bytes jsonify() would send
+    body = current_app.json.response({'id': question_id, 'prompt': prompt, 'options': options}).get_data()
+    options_html = Markup(render_template('_quiz_options.html', options=options).strip())
+    return QuestionPayload(question_id, prompt, body, options_html)
+
+
+def _current_version():
+    global _version, _version_checked_at
+    now = time.monotonic()
+    if now - _version_checked_at < SEED_VERSION_TTL:
+        return _version
+    version = seed_version()
+    with _lock:
+        if version != _version:
+            _payloads.clear()
+            _version = version
+        _version_checked_at = now
+    return version
+
+
+def get_payload(question_id):
+    """Cached payload for a question, or None if it does not exist"""
+    version = _current_version()
+    with _lock:
+        payload = _payloads.get((question_id, version))
+    if payload is not None:
+        return payload
+
+    row = db.session.query(
+        Question.id, Question.prompt, Question.option_a, Question.option_b, Question.option_c, Question.option_d
+    ).filter(Question.id == question_id).first()
+    if row is None:
+        return None
+    payload = _build(row)
+    with _lock:
+        if version == _version:
+            _payloads[(question_id, version)] = payload
+    return payload
+
+
+def clear():
+    global _version_checked_at
+    with _lock:
+        _payloads.clear()
+        _version_checked_at = float('-inf')
@@ -1,30 +1,26 @@
-from flask import Blueprint, request, jsonify, session
-from .quiz_service import get_random_question, submit_answer
+from flask import Blueprint, Response, request, jsonify, session, current_app
+from .quiz_service import get_next_question, submit_answer
+from .adaptive_service import SELECTION_MODES
 
 quiz_routes = Blueprint('quiz', __name__)
 
 
 @quiz_routes.route('/quiz/question', methods=['GET'])
 def get_question():
-    """Get a random quiz question"""
+    """Get the next quiz question (random, or adaptive with ?mode=adaptive)"""
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    question = get_random_question(user_id)
+    mode = request.args.get('mode', current_app.config.get('QUIZ_SELECTION_MODE', 'random'))
+    if mode not in SELECTION_MODES:
+        return jsonify({'error': f'mode must be one of: {", ".join(SELECTION_MODES)}'}), 400
+    
+    question = get_next_question(user_id, mode)
     if not question:
         return jsonify({'error': 'No questions available'}), 404
     
-    return jsonify({
-        'id': question.id,
-        'prompt': question.prompt,
-        'options': {
-            'a': question.option_a,
-            'b': question.option_b,
-            'c': question.option_c,
-            'd': question.option_d
-        }
-    }), 200
+    return Response(question.json, mimetype=current_app.json.mimetype), 200
 
 
 @quiz_routes.route('/quiz/answer', methods=['POST'])
@@ -1,28 +1,40 @@
 from db.tables import db, User, Question, Score
 from sqlalchemy import func
+from .adaptive_service import rating_engine, get_adaptive_question
+from .retention_service import answered_question_ids, has_correct_answer
+from . import fragment_cache
+from .question_cache import get_payload
 import random
 
 
 def get_question_by_id(question_id):
-    """Get a specific question by ID"""
-    return Question.query.get(question_id)
+    """Get the cached payload of a specific question by ID"""
+    return get_payload(question_id)
 
 
 def get_random_question(user_id=None):
-    """Get a random question, preferring unanswered ones if user is logged in"""
+    """Get a random question payload, preferring unanswered ones if user is logged in"""
     if user_id:
-        answered_ids = db.session.query(Score.question_id).filter_by(user_id=user_id).distinct().all()
-        answered_ids = [q[0] for q in answered_ids]
+        answered_ids = [q[0] for q in answered_question_ids(user_id).all()]
         
-        unanswered = Question.query.filter(~Question.id.in_(answered_ids)).all()
+        unanswered = db.session.query(Question.id).filter(~Question.id.in_(answered_ids)).all()
         if unanswered:
-            return random.choice(unanswered)
+            return get_payload(random.choice(unanswered)[0])
     
-    questions = Question.query.all()
-    if not questions:
+    question_ids = db.session.query(Question.id).all()
+    if not question_ids:
         return None
     
-    return random.choice(questions)
+    return get_payload(random.choice(question_ids)[0])
+
+
+def get_next_question(user_id=None, mode='random'):
+    """Get the next question payload using the requested selection mode ('random' or 'adaptive')"""
+    if mode == 'adaptive':
+        question = get_adaptive_question(user_id)
+        if question:
+            return question
+    return get_random_question(user_id)
 
 
 def submit_answer(user_id, question_id, answer):
@@ -38,12 +50,9 @@ def submit_answer(user_id, question_id, answer):
     is_correct = question.is_correct(answer)
     points = 10 if is_correct else 0
     
-    previously_correct = Score.query.filter_by(
-        user_id=user_id,
-        question_id=question_id,
-        correct=True
-    ).first() is not None
+    previously_correct = has_correct_answer(user_id, question_id)
     
+    old_total = user.total_score
     if is_correct and not previously_correct:
         user.total_score += 10
     
@@ -51,17 +60,31 @@ def submit_answer(user_id, question_id, answer):
     score.user_id = user_id
     score.question_id = question_id
     score.correct = is_correct
+    score.answer = answer.lower()
     score.points = points
     
     try:
         db.session.add(score)
+        db.session.flush()
+        score_id, total_score = score.id, user.total_score
         db.session.commit()
-        return True, None, {
-            'correct': is_correct,
-            'points': points,
-            'total_score': user.total_score,
-            'already_answered': previously_correct
-        }
     except Exception as e:
         db.session.rollback()
         return False, 'Failed to save answer', None
+
+    if total_score != old_total:
+        with fragment_cache.batch():
+            fragment_cache.invalidate_leaderboard_scores(old_total, total_score)
+            fragment_cache.invalidate(('profile', user_id))
+
+    # The answer is saved; a failed rating update only costs adaptive accuracy until the next refresh
+    try:
+        rating_engine.record_answer(user_id, question_id, is_correct, score_id)
+    except Exception as e:
+        print(f"Rating update failed for score {score_id}: {e}")
+    return True, None, {
+        'correct': is_correct,
+        'points': points,
+        'total_score': total_score,
+        'already_answered': previously_correct
+    }
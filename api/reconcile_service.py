@@ -0,0 +1,78 @@
+"""
+Consistency check for the denormalized User.total_score.
+
+submit_answer adds 10 points the first time a user answers a question
+correctly. The expected score is therefore 10 points per distinct question
+the user has ever answered correctly, in scores or in the compacted
+score_summaries. find_score_discrepancies() computes that for every user
+in a single grouped query; reconcile_total_scores() also writes the fixes
+in batches.
+"""
+from sqlalchemy import bindparam, func, literal_column
+from db.tables import db, User, Score, ScoreSummary
+from . import fragment_cache
+
+POINTS_PER_QUESTION = 10
+
+
+def _expected_scores():
+    """Subquery of (user_id, expected) for users with at least one correct answer"""
+    correct = db.session.query(
+        Score.user_id.label('user_id'), Score.question_id.label('question_id')
+    ).filter(Score.correct.is_(True)).union(
+        db.session.query(ScoreSummary.user_id, ScoreSummary.question_id).filter(ScoreSummary.corrects > 0)
+    ).subquery()
+    return db.session.query(
+        correct.c.user_id.label('user_id'),
+        (func.count() * POINTS_PER_QUESTION).label('expected'),
+    ).group_by(correct.c.user_id).subquery()
+
+
+def find_score_discrepancies():
+    """
+    Users whose stored total_score differs from their answer history
+
+    Returns:
+        List of (user_id, nickname, stored, expected) tuples ordered by user id
+    """
+    expected = _expected_scores()
+    expected_score = func.coalesce(expected.c.expected, literal_column('0'))
+    rows = db.session.query(User.id, User.nickname, User.total_score, expected_score)\
+        .outerjoin(expected, expected.c.user_id == User.id)\
+        .filter(User.total_score != expected_score)\
+        .order_by(User.id).all()
+    return [tuple(row) for row in rows]
+
+
+def reconcile_total_scores(apply=False, batch_size=1000):
+    """
+    Compare every user's total_score with their history and optionally fix it
+
+    Args:
+        apply: Write the expected scores; otherwise only report
+        batch_size: Users updated per transaction
+
+    Returns:
+        Dictionary with the discrepancies found, users fixed, and users
+        skipped because their score changed while the check ran
+    """
+    discrepancies = find_score_discrepancies()
+    fixed = skipped = 0
+    if apply:
+        # Only overwrite the value that was checked, so an answer submitted
+        # in the meantime is not lost; such users are picked up on the next run
+        statement = User.__table__.update()\
+            .where(User.id == bindparam('user_id'), User.total_score == bindparam('stored'))\
+            .values(total_score=bindparam('expected'))
+        for start in range(0, len(discrepancies), batch_size):
+            batch = discrepancies[start:start + batch_size]
+            result = db.session.execute(statement, [
+                {'user_id': user_id, 'stored': stored, 'expected': expected}
+                for user_id, _, stored, expected in batch
+            ])
+            db.session.commit()
+            fixed += result.rowcount
+            skipped += len(batch) - result.rowcount
+        if fixed:
+            fragment_cache.clear()
+    return {'discrepancies': discrepancies, 'fixed': fixed, 'skipped': skipped}
@@ -0,0 +1,149 @@
+"""
+Score history retention: compact old attempts into per-(user, question)
+summaries.
+
+Attempts older than the retention age are folded into ScoreSummary rows
+(attempts, corrects, points, first/last attempt times) and deleted from
+scores. The work is done in bounded batches, each in its own short
+transaction, so writers are never locked out for long.
+
+Everything that reads attempt history (profile statistics, the
+previously-correct check in submit_answer, unanswered-question selection,
+the adaptive engine) also reads the summaries, so compaction does not
+change scores, ranks or statistics. Compaction stops at item analysis's
+high-water mark so no attempt is compacted before it has been analysed;
+until item analysis has run once, nothing is compacted. Exports and the
+recent-activity list only show attempts that are still in the scores
+table.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from db.tables import db, Score, ScoreSummary, JobState
+
+DEFAULT_RETENTION_DAYS = 90
+
+
+def _summarize_batch(rows):
+    """Aggregate a batch of (id, user_id, question_id, correct, points, timestamp) per (user, question)"""
+    summaries = {}
+    for _, user_id, question_id, correct, points, timestamp in rows:
+        summary = summaries.get((user_id, question_id))
+        if summary is None:
+            summary = summaries[(user_id, question_id)] = {
+                'user_id': user_id,
+                'question_id': question_id,
+                'attempts': 0,
+                'corrects': 0,
+                'points': 0,
+                'first_attempt_at': timestamp,
+                'first_attempt_correct': correct,
+                'first_correct_at': None,
+                'last_attempt_at': timestamp,
+            }
+        summary['attempts'] += 1
+        summary['points'] += points
+        if correct:
+            summary['corrects'] += 1
+            if summary['first_correct_at'] is None or timestamp < summary['first_correct_at']:
+                summary['first_correct_at'] = timestamp
+        if timestamp < summary['first_attempt_at']:
+            summary['first_attempt_at'] = timestamp
+            summary['first_attempt_correct'] = correct
+        if timestamp > summary['last_attempt_at']:
+            summary['last_attempt_at'] = timestamp
+    return summaries
+
+
+def _merge_into(existing, new):
+    existing.attempts += new['attempts']
+    existing.corrects += new['corrects']
+    existing.points += new['points']
+    if new['first_attempt_at'] < existing.first_attempt_at:
+        existing.first_attempt_at = new['first_attempt_at']
+        existing.first_attempt_correct = new['first_attempt_correct']
+    if new['first_correct_at'] and (existing.first_correct_at is None
+                                    or new['first_correct_at'] < existing.first_correct_at):
+        existing.first_correct_at = new['first_correct_at']
+    if new['last_attempt_at'] > existing.last_attempt_at:
+        existing.last_attempt_at = new['last_attempt_at']
+
+
+def compact_scores(older_than_days=DEFAULT_RETENTION_DAYS, batch_size=5000, max_batches=None):
+    """
+    Fold attempts older than `older_than_days` into score_summaries
+
+    Args:
+        older_than_days: Retention age; newer attempts are kept as-is
+        batch_size: Attempts compacted per transaction
+        max_batches: Stop after this many batches (None: until done)
+
+    Returns:
+        Dictionary with the number of attempts compacted, batches run,
+        summaries touched and the highest score id that may be compacted
+        (0 until item analysis has run)
+    """
+    from .analytics_service import HIGH_WATER_MARK
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    analysed = db.session.get(JobState, HIGH_WATER_MARK)
+    analysed_up_to = analysed.value if analysed is not None else 0
+
+    compacted = batches = touched = 0
+    while analysed_up_to > 0 and (max_batches is None or batches < max_batches):
+        rows = db.session.query(
+            Score.id, Score.user_id, Score.question_id, Score.correct, Score.points, Score.timestamp
+        ).filter(
+            Score.timestamp < cutoff, Score.id <= analysed_up_to
+        ).order_by(Score.timestamp, Score.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        summaries = _summarize_batch(rows)
+        touched += len(summaries)
+        # Look up by user_id (the primary key prefix) and match pairs here;
+        # a (user_id, question_id) IN list is not index-assisted on SQLite
+        user_ids = sorted({user_id for user_id, _ in summaries})
+        for start in range(0, len(user_ids), 500):
+            existing = ScoreSummary.query.filter(ScoreSummary.user_id.in_(user_ids[start:start + 500]))
+            for summary in existing:
+                new = summaries.pop((summary.user_id, summary.question_id), None)
+                if new is not None:
+                    _merge_into(summary, new)
+        for values in summaries.values():
+            db.session.add(ScoreSummary(**values))
+
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), 500):
+            Score.query.filter(Score.id.in_(ids[start:start + 500])).delete(synchronize_session=False)
+
+        db.session.commit()
+        compacted += len(rows)
+        batches += 1
+
+    return {'compacted': compacted, 'batches': batches, 'summaries_touched': touched,
+            'analysed_up_to': analysed_up_to}
+
+
+def answered_question_ids(user_id):
+    """Query for the ids of every question the user has attempted, compacted or not"""
+    return db.session.query(Score.question_id).filter_by(user_id=user_id).union(
+        db.session.query(ScoreSummary.question_id).filter_by(user_id=user_id)
+    )
+
+
+def has_correct_answer(user_id, question_id):
+    """Whether the user has ever answered this question correctly"""
+    if Score.query.filter_by(user_id=user_id, question_id=question_id, correct=True).first() is not None:
+        return True
+    summary = db.session.get(ScoreSummary, (user_id, question_id))
+    return summary is not None and summary.corrects > 0
+
+
+def attempt_totals(user_id):
+    """(attempts, points) over the user's whole history, compacted or not"""
+    attempts, points = db.session.query(func.count(Score.id), func.coalesce(func.sum(Score.points), 0))\
+        .filter(Score.user_id == user_id).one()
+    compacted_attempts, compacted_points = db.session.query(
+        func.coalesce(func.sum(ScoreSummary.attempts), 0), func.coalesce(func.sum(ScoreSummary.points), 0)
+    ).filter(ScoreSummary.user_id == user_id).one()
+    return attempts + compacted_attempts, points + compacted_points
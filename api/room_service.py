@@ -0,0 +1,516 @@
+"""
+Live quiz rooms: many players answer the same question against a timer.
+
+Room state (players, the current question, answers and the room
+scoreboard) lives in the worker process, like the rating engine and the
+fragment cache. Every player of a room must therefore reach the same
+process: run one worker, or send every /api/rooms request to a dedicated
+single-worker instance. Routing by code alone does not work, because the
+room is created wherever POST /api/rooms lands.
+
+Each room keeps a short log of events (round_started, progress,
+round_ended, room_closed). An event is serialized to Server-Sent Events
+text once, when it is published. Listeners remember the id of the last
+event they sent and wait for newer ones, on the room's condition variable
+(WSGI streams) or on an asyncio.Event (asgi.py). Publishing costs the same
+with 5 listeners or 500.
+
+Answers are graded in memory. A round ends when its timer runs out, when
+every player has answered, or when the host ends it. All its answers are
+then written to scores in one transaction, and users.total_score is raised
+for first-time correct answers with one executemany UPDATE. A failed write
+is kept and retried every WRITE_RETRY_SECONDS, also after the room closes.
+Rating and cache updates run once the write has committed and are never
+retried, so a failure there cannot store the answers twice.
+"""
+import json
+import random
+import secrets
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, insert
+from db.tables import db, User, Score, ScoreSummary, Question
+from .adaptive_service import rating_engine
+from .question_cache import get_payload
+from . import fragment_cache
+
+DEFAULT_ROUND_SECONDS = 20
+MIN_ROUND_SECONDS = 5
+MAX_ROUND_SECONDS = 300
+MAX_PLAYERS = 1000
+MAX_ROOMS = 200
+ROOM_IDLE_SECONDS = 3600
+SCOREBOARD_SIZE = 10
+PROGRESS_INTERVAL = 0.5
+EVENT_LOG_SIZE = 64
+KEEPALIVE_SECONDS = 15
+WRITE_RETRY_SECONDS = 5
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+
+RoomEvent = namedtuple('RoomEvent', ['id', 'text'])
+
+
+class Room:
+    """One room's players, current round and event log; all fields are guarded by the lock"""
+
+    def __init__(self, code, host_id, round_seconds, app):
+        self.code = code
+        self.host_id = host_id
+        self.round_seconds = round_seconds
+        self.app = app
+        self.players = {}        # user id -> nickname
+        self.standings = {}      # user id -> [points, correct answers, total answer time ms]
+        self.ranks = {}          # user id -> rank after the last round
+        self.round = 0
+        self.round_open = False
+        self.question = None     # public question dict of the current/last round
+        self.correct_option = None
+        self.started_at = 0.0
+        self.deadline = 0.0
+        self.ends_at = 0.0
+        self.answers = {}        # user id -> (answer, elapsed ms, received at)
+        self.pending = []        # score rows not yet written
+        self.closed = False
+        self.last_activity = time.monotonic()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events = []
+        self._next_event_id = 1
+        self._last_progress = 0.0
+        self._timer = None
+        self._retry_timer = None
+        self._waiters = set()    # (event loop, asyncio.Event) of asgi.py listeners
+
+    # -- events -----------------------------------------------------------
+
+    def _publish(self, name, data):
+        """Append an event to the log and wake every listener; caller holds the lock"""
+        event_id = self._next_event_id
+        self._next_event_id += 1
+        text = f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        self._events.append(RoomEvent(event_id, text))
+        if len(self._events) > EVENT_LOG_SIZE:
+            del self._events[:len(self._events) - EVENT_LOG_SIZE]
+        self._changed.notify_all()
+        for loop, waiter in list(self._waiters):
+            loop.call_soon_threadsafe(waiter.set)
+
+    def _events_after(self, last_event_id):
+        if not self._events or self._events[-1].id <= last_event_id:
+            return []
+        start = max(0, last_event_id - self._events[0].id + 1)
+        return self._events[start:]
+
+    def events_after(self, last_event_id):
+        """(events newer than last_event_id, whether the room is closed)"""
+        with self._lock:
+            return self._events_after(last_event_id), self.closed
+
+    def wait_events(self, last_event_id, timeout):
+        """Block until there are events newer than last_event_id, the room closes, or timeout"""
+        with self._changed:
+            if not self._events_after(last_event_id) and not self.closed:
+                self._changed.wait(timeout)
+            return self._events_after(last_event_id), self.closed
+
+    def add_waiter(self, loop, waiter):
+        with self._lock:
+            self._waiters.add((loop, waiter))
+
+    def remove_waiter(self, loop, waiter):
+        with self._lock:
+            self._waiters.discard((loop, waiter))
+
+    def can_listen(self, user_id):
+        return user_id == self.host_id or user_id in self.players
+
+    # -- state ------------------------------------------------------------
+
+    def _scoreboard(self):
+        ranked = sorted(self.standings.items(), key=lambda item: (-item[1][0], item[1][2], item[0]))
+        return [
+            {'rank': rank, 'nickname': self.players.get(user_id), 'points': points, 'correct': correct}
+            for rank, (user_id, (points, correct, _)) in enumerate(ranked[:SCOREBOARD_SIZE], 1)
+        ], {user_id: rank for rank, (user_id, _) in enumerate(ranked, 1)}
+
+    def _round_started_data(self):
+        return {
+            'round': self.round,
+            'question': self.question,
+            'ends_at': self.ends_at,
+            'seconds': self.round_seconds,
+            'players': len(self.players),
+        }
+
+    def snapshot(self, user_id):
+        with self._lock:
+            scoreboard, _ = self._scoreboard()
+            answer = self.answers.get(user_id)
+            standing = self.standings.get(user_id, [0, 0, 0])
+            return {
+                'code': self.code,
+                'is_host': user_id == self.host_id,
+                'joined': user_id in self.players,
+                'players': len(self.players),
+                'round': self.round,
+                'round_open': self.round_open,
+                'question': self.question,
+                'ends_at': self.ends_at if self.round_open else None,
+                'correct_option': None if self.round_open else self.correct_option,
+                'answered': len(self.answers) if self.round_open else None,
+                'your_answer': answer[0] if answer else None,
+                'your_points': standing[0],
+                'your_rank': self.ranks.get(user_id),
+                'scoreboard': scoreboard,
+                'closed': self.closed,
+                'last_event_id': self._next_event_id - 1,
+            }
+
+
+_rooms = {}
+_rooms_lock = threading.Lock()
+
+
+def _new_code():
+    while True:
+        code = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(6))
+        if code not in _rooms:
+            return code
+
+
+def _expire_idle_rooms():
+    """
+    Close rooms nobody has used for ROOM_IDLE_SECONDS; caller holds
+    _rooms_lock and then passes the returned rooms to _write_pending()
+    """
+    cutoff = time.monotonic() - ROOM_IDLE_SECONDS
+    expired = []
+    for code, room in list(_rooms.items()):
+        if room.last_activity < cutoff and not room.round_open:
+            with room._lock:
+                room.closed = True
+                room._publish('room_closed', {'reason': 'idle'})
+            del _rooms[code]
+            expired.append(room)
+    return expired
+
+
+def get_room(code):
+    return _rooms.get((code or '').upper())
+
+
+def create_room(host_id, round_seconds=DEFAULT_ROUND_SECONDS):
+    """
+    Open a room hosted by host_id
+    Returns: (success: bool, error_message: str or None, data: dict or None)
+    """
+    if not host_id:
+        return False, 'Unauthorized', None
+    if not isinstance(round_seconds, int) or not MIN_ROUND_SECONDS <= round_seconds <= MAX_ROUND_SECONDS:
+        return False, f'round_seconds must be between {MIN_ROUND_SECONDS} and {MAX_ROUND_SECONDS}', None
+
+    with _rooms_lock:
+        expired = _expire_idle_rooms()
+        full = len(_rooms) >= MAX_ROOMS
+        if not full:
+            room = Room(_new_code(), host_id, round_seconds, current_app._get_current_object())
+            _rooms[room.code] = room
+    for idle_room in expired:
+        _write_pending(idle_room)
+    if full:
+        return False, 'Too many open rooms', None
+    return True, None, {'code': room.code, 'round_seconds': round_seconds}
+
+
+def join_room(code, user_id):
+    """Add the user to the room's players"""
+    if not user_id:
+        return False, 'Unauthorized', None
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+
+    nickname = db.session.query(User.nickname).filter_by(id=user_id).scalar()
+    if nickname is None:
+        return False, 'User not found', None
+
+    with room._lock:
+        if room.closed:
+            return False, 'Room is closed', None
+        if user_id not in room.players:
+            if len(room.players) >= MAX_PLAYERS:
+                return False, 'Room is full', None
+            room.players[user_id] = nickname
+            room.standings[user_id] = [0, 0, 0]
+        room.last_activity = time.monotonic()
+    return True, None, room.snapshot(user_id)
+
+
+def get_room_state(code, user_id):
+    """Current round, the user's own standing and the top of the scoreboard"""
+    if not user_id:
+        return False, 'Unauthorized', None
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+    return True, None, room.snapshot(user_id)
+
+
+def start_round(code, user_id, question_id=None):
+    """Host only: ask a question (a random one unless question_id is given) to every player"""
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+    if user_id != room.host_id:
+        return False, 'Only the host can start a round', None
+
+    if question_id is None:
+        question_ids = db.session.query(Question.id).all()
+        if not question_ids:
+            return False, 'No questions available', None
+        question_id = random.choice(question_ids)[0]
+    payload = get_payload(question_id)
+    correct_option = db.session.query(Question.correct_option).filter_by(id=question_id).scalar()
+    if payload is None or correct_option is None:
+        return False, 'Question not found', None
+
+    with room._lock:
+        if room.closed:
+            return False, 'Room is closed', None
+        if room.round_open:
+            return False, 'A round is already running', None
+        room.round += 1
+        room.round_open = True
+        room.question = json.loads(payload.json)
+        room.correct_option = correct_option.lower()
+        room.answers = {}
+        room.started_at = time.monotonic()
+        room.deadline = room.started_at + room.round_seconds
+        room.ends_at = time.time() + room.round_seconds
+        room.last_activity = room.started_at
+        room._publish('round_started', room._round_started_data())
+        room._timer = threading.Timer(room.round_seconds, _finish_round, args=(room, room.round))
+        room._timer.daemon = True
+        room._timer.start()
+        data = room._round_started_data()
+    return True, None, data
+
+
+def submit_room_answer(code, user_id, answer):
+    """Record a player's answer to the current round; graded when the round ends"""
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+
+    now = time.monotonic()
+    received_at = datetime.utcnow()
+    with room._lock:
+        if user_id not in room.players:
+            return False, 'Join the room first', None
+        if not room.round_open or now >= room.deadline:
+            return False, 'No round is running', None
+        if user_id in room.answers:
+            return False, 'Already answered this round', None
+        room.answers[user_id] = (answer, (now - room.started_at) * 1000, received_at)
+        room.last_activity = now
+        everyone = len(room.answers) >= len(room.players)
+        if not everyone and now - room._last_progress >= PROGRESS_INTERVAL:
+            room._last_progress = now
+            room._publish('progress', {'round': room.round, 'answered': len(room.answers),
+                                       'players': len(room.players)})
+        current_round = room.round
+
+    if everyone:
+        # Close right away, off the request thread so this answer is not kept waiting for the write
+        threading.Thread(target=_finish_round, args=(room, current_round), daemon=True).start()
+    return True, None, {'round': current_round, 'answer': answer}
+
+
+def end_round(code, user_id):
+    """Host only: close the running round now"""
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+    if user_id != room.host_id:
+        return False, 'Only the host can end a round', None
+    if not _finish_round(room, room.round):
+        return False, 'No round is running', None
+    return True, None, room.snapshot(user_id)
+
+
+def close_room(code, user_id):
+    """Host only: end any running round, write pending answers and close the room"""
+    room = get_room(code)
+    if room is None:
+        return False, 'Room not found', None
+    if user_id != room.host_id:
+        return False, 'Only the host can close the room', None
+
+    _finish_round(room, room.round)
+    with room._lock:
+        room.closed = True
+        room._publish('room_closed', {'reason': 'host'})
+    with _rooms_lock:
+        _rooms.pop(room.code, None)
+    _write_pending(room)
+    return True, None, {'code': room.code, 'rounds': room.round}
+
+
+def _finish_round(room, round_number):
+    """Grade and close the round (once), publish the results and persist its answers"""
+    with room._lock:
+        if not room.round_open or room.round != round_number:
+            return False
+        room.round_open = False
+        if room._timer is not None:
+            room._timer.cancel()
+            room._timer = None
+
+        correct_count = 0
+        for user_id, (answer, elapsed_ms, received_at) in room.answers.items():
+            correct = answer == room.correct_option
+            standing = room.standings[user_id]
+            if correct:
+                correct_count += 1
+                standing[0] += 10
+                standing[1] += 1
+            standing[2] += elapsed_ms
+            room.pending.append({
+                'user_id': user_id,
+                'question_id': room.question['id'],
+                'correct': correct,
+                'answer': answer,
+                'points': 10 if correct else 0,
+                'timestamp': received_at,
+            })
+        scoreboard, room.ranks = room._scoreboard()
+        room._publish('round_ended', {
+            'round': room.round,
+            'correct_option': room.correct_option,
+            'answered': len(room.answers),
+            'correct': correct_count,
+            'distribution': dict(Counter(answer for answer, _, _ in room.answers.values())),
+            'players': len(room.players),
+            'scoreboard': scoreboard,
+        })
+    _write_pending(room)
+    return True
+
+
+def _write_pending(room):
+    with room._lock:
+        rows, room.pending = room.pending, []
+    if not rows:
+        return
+    with room.app.app_context():
+        try:
+            stored = _store_answers(rows)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Room {room.code}: failed to save {len(rows)} answers, retrying in {WRITE_RETRY_SECONDS}s: {e}")
+            with room._lock:
+                room.pending[:0] = rows
+                if room._retry_timer is None:
+                    room._retry_timer = threading.Timer(WRITE_RETRY_SECONDS, _retry_pending, args=(room,))
+                    room._retry_timer.daemon = True
+                    room._retry_timer.start()
+            return
+        # Committed: nothing below may put the rows back in the queue
+        _after_store(*stored)
+
+
+def _retry_pending(room):
+    with room._lock:
+        room._retry_timer = None
+    _write_pending(room)
+
+
+def persist_answers(rows):
+    """
+    Write a batch of room answers to scores in one transaction, then
+    update the ratings and cached fragments
+
+    users.total_score gains 10 per question a user answers correctly for
+    the first time, as in submit_answer; the increment is done in SQL so
+    concurrent single-player answers are not lost.
+    """
+    inserted, awarded, old_totals = _store_answers(rows)
+    _after_store(inserted, awarded, old_totals)
+    return len(inserted)
+
+
+def _store_answers(rows):
+    """The transaction of persist_answers(): (inserted rows, points awarded per user, old totals)"""
+    user_ids = sorted({row['user_id'] for row in rows})
+    question_ids = sorted({row['question_id'] for row in rows})
+    already_correct = set()
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        already_correct.update(db.session.query(Score.user_id, Score.question_id).filter(
+            Score.user_id.in_(chunk), Score.question_id.in_(question_ids), Score.correct.is_(True)
+        ).union(db.session.query(ScoreSummary.user_id, ScoreSummary.question_id).filter(
+            ScoreSummary.user_id.in_(chunk), ScoreSummary.question_id.in_(question_ids), ScoreSummary.corrects > 0
+        )).all())
+
+    awarded = Counter()
+    for row in rows:
+        pair = (row['user_id'], row['question_id'])
+        if row['correct'] and pair not in already_correct:
+            already_correct.add(pair)
+            awarded[row['user_id']] += 10
+
+    old_totals = {}
+    awarded_ids = sorted(awarded)
+    for start in range(0, len(awarded_ids), 500):
+        old_totals.update(db.session.query(User.id, User.total_score).filter(
+            User.id.in_(awarded_ids[start:start + 500])
+        ).all())
+
+    # One multi-row INSERT; RETURNING order is not guaranteed, so the ids are sorted below
+    inserted = db.session.execute(
+        insert(Score).returning(Score.id, Score.user_id, Score.question_id, Score.correct),
+        rows
+    ).all()
+    if awarded:
+        db.session.execute(
+            User.__table__.update().where(User.id == bindparam('user_id'))
+            .values(total_score=User.total_score + bindparam('points')),
+            [{'user_id': user_id, 'points': points} for user_id, points in awarded.items()]
+        )
+    db.session.commit()
+    return inserted, awarded, old_totals
+
+
+def _after_store(inserted, awarded, old_totals):
+    """Side effects of committed answers; failures are logged, the answers stay written"""
+    try:
+        rating_engine.record_answers([
+            (user_id, question_id, correct, score_id) for score_id, user_id, question_id, correct in sorted(inserted)
+        ])
+    except Exception as e:
+        print(f"Rating update failed for {len(inserted)} room answers: {e}")
+    try:
+        with fragment_cache.batch():
+            for user_id, points in awarded.items():
+                old_total = old_totals.get(user_id, 0)
+                fragment_cache.invalidate_leaderboard_scores(old_total, old_total + points)
+                fragment_cache.invalidate(('profile', user_id))
+    except Exception as e:
+        print(f"Fragment invalidation failed for {len(awarded)} players: {e}")
+
+
+def iter_sse(room, last_event_id=0):
+    """SSE text for a WSGI streaming response: new events as they are published, keepalives in between"""
+    yield 'retry: 2000\n\n'
+    while True:
+        events, closed = room.wait_events(last_event_id, KEEPALIVE_SECONDS)
+        for event in events:
+            last_event_id = event.id
+            yield event.text
+        if closed:
+            return
+        if not events:
+            yield ': keepalive\n\n'
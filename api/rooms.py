@@ -0,0 +1,104 @@
+from flask import Blueprint, Response, request, jsonify, session
+from .room_service import (create_room, join_room, get_room, get_room_state, start_round, submit_room_answer,
+                           end_round, close_room, iter_sse, DEFAULT_ROUND_SECONDS)
+
+room_routes = Blueprint('rooms', __name__)
+
+ERROR_STATUS = {
+    'Unauthorized': 401,
+    'Room not found': 404,
+    'User not found': 404,
+    'Question not found': 404,
+    'No questions available': 404,
+    'Only the host can start a round': 403,
+    'Only the host can end a round': 403,
+    'Only the host can close the room': 403,
+    'Join the room first': 403,
+    'Room is closed': 409,
+    'Room is full': 409,
+    'A round is already running': 409,
+    'No round is running': 409,
+    'Already answered this round': 409,
+    'Too many open rooms': 503,
+}
+
+
+def _respond(success, error, data, status=200):
+    if success:
+        return jsonify(data), status
+    return jsonify({'error': error}), ERROR_STATUS.get(error, 400)
+
+
+@room_routes.route('/rooms', methods=['POST'])
+def create():
+    """Open a live quiz room hosted by the current user"""
+    data = request.get_json(silent=True) or {}
+    return _respond(*create_room(session.get('user_id'), data.get('round_seconds', DEFAULT_ROUND_SECONDS)), status=201)
+
+
+@room_routes.route('/rooms/<code>', methods=['GET'])
+def state(code):
+    """Room state: current round, scoreboard and the caller's own standing"""
+    return _respond(*get_room_state(code, session.get('user_id')))
+
+
+@room_routes.route('/rooms/<code>/join', methods=['POST'])
+def join(code):
+    """Join a room as a player"""
+    return _respond(*join_room(code, session.get('user_id')))
+
+
+@room_routes.route('/rooms/<code>/rounds', methods=['POST'])
+def start(code):
+    """Host: start a round with the given question_id, or a random question"""
+    data = request.get_json(silent=True) or {}
+    question_id = data.get('question_id')
+    if question_id is not None and not isinstance(question_id, int):
+        return jsonify({'error': 'question_id must be an integer'}), 400
+    return _respond(*start_round(code, session.get('user_id'), question_id), status=201)
+
+
+@room_routes.route('/rooms/<code>/answer', methods=['POST'])
+def answer(code):
+    """Answer the running round (a, b, c or d); results arrive with the round_ended event"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('answer'), str):
+        return jsonify({'error': 'Answer is required'}), 400
+    choice = data['answer'].strip().lower()
+    if choice not in ['a', 'b', 'c', 'd']:
+        return jsonify({'error': 'Answer must be a, b, c, or d'}), 400
+    return _respond(*submit_room_answer(code, session.get('user_id'), choice))
+
+
+@room_routes.route('/rooms/<code>/end-round', methods=['POST'])
+def finish(code):
+    """Host: close the running round before its timer runs out"""
+    return _respond(*end_round(code, session.get('user_id')))
+
+
+@room_routes.route('/rooms/<code>/close', methods=['POST'])
+def close(code):
+    """Host: close the room"""
+    return _respond(*close_room(code, session.get('user_id')))
+
+
+@room_routes.route('/rooms/<code>/events', methods=['GET'])
+def events(code):
+    """Server-Sent Events stream of the room's rounds and results (players and host only)"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    room = get_room(code)
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    if not room.can_listen(user_id):
+        return jsonify({'error': 'Join the room first'}), 403
+
+    # EventSource sends Last-Event-ID when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or '0'
+    if not last_event_id.isdigit():
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    response = Response(iter_sse(room, int(last_event_id)), content_type='text/event-stream; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
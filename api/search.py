@@ -0,0 +1,31 @@
+"""API endpoints for question search"""
+from flask import Blueprint, jsonify, request, session
+from api.search_service import search_questions
+
+
+search_routes = Blueprint('search_routes', __name__)
+
+
+@search_routes.route('/questions/search', methods=['GET'])
+def api_search_questions():
+    """Search questions by keyword (ranked, paginated)"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+
+    if not query:
+        return jsonify({'error': 'Parameter <q> is required'}), 400
+
+    if len(query) > 200:
+        return jsonify({'error': 'Query must be at most 200 characters'}), 400
+
+    if page < 1:
+        return jsonify({'error': 'Page must be >= 1'}), 400
+
+    if per_page < 1 or per_page > 100:
+        return jsonify({'error': 'per_page must be between 1 and 100'}), 400
+
+    return jsonify(search_questions(query, page, per_page))
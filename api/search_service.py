@@ -0,0 +1,115 @@
+"""Service for keyword search over the question bank"""
+import math
+import re
+from sqlalchemy import text, or_
+from db.tables import db, Question
+from db.search_index import SEARCH_TABLE, search_index_supported
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _build_match_query(query):
+    """
+    Turn free text into a safe FTS5 expression.
+    Every word is quoted (so FTS operators in user input are inert) and
+    prefix-matched, and all words must be present.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _paginate(results, total, page, per_page):
+    return {
+        'results': results,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': math.ceil(total / per_page) if total else 0,
+        'has_prev': page > 1,
+        'has_next': page * per_page < total
+    }
+
+
+def _search_fts(match, page, per_page):
+    """Ranked search through the FTS5 index (bm25, prompt weighted higher)"""
+    total = db.session.execute(
+        text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"),
+        {'match': match}
+    ).scalar()
+
+    rows = db.session.execute(text(
+        f"SELECT q.id, q.prompt, q.option_a, q.option_b, q.option_c, q.option_d, "
+        f"snippet({SEARCH_TABLE}, -1, '[', ']', '...', 12) AS snippet, "
+        f"bm25({SEARCH_TABLE}, 10.0, 1.0, 1.0, 1.0, 1.0) AS rank "
+        f"FROM {SEARCH_TABLE} JOIN questions q ON q.id = {SEARCH_TABLE}.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH :match "
+        f"ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page}).all()
+
+    return total, [
+        {
+            'id': row.id,
+            'prompt': row.prompt,
+            'options': {
+                'a': row.option_a,
+                'b': row.option_b,
+                'c': row.option_c,
+                'd': row.option_d
+            },
+            'snippet': row.snippet,
+            'score': round(-row.rank, 4)
+        }
+        for row in rows
+    ]
+
+
+def _search_like(tokens, page, per_page):
+    """Fallback for databases without FTS5: unranked substring match"""
+    columns = [Question.prompt, Question.option_a, Question.option_b,
+               Question.option_c, Question.option_d]
+    query = Question.query
+    for token in tokens:
+        query = query.filter(or_(*[column.ilike(f'%{token}%') for column in columns]))
+
+    total = query.count()
+    questions = query.order_by(Question.id).offset((page - 1) * per_page).limit(per_page).all()
+
+    return total, [
+        {
+            'id': question.id,
+            'prompt': question.prompt,
+            'options': {
+                'a': question.option_a,
+                'b': question.option_b,
+                'c': question.option_c,
+                'd': question.option_d
+            },
+            'snippet': None,
+            'score': None
+        }
+        for question in questions
+    ]
+
+
+def search_questions(query, page=1, per_page=20):
+    """
+    Search questions by keyword in the prompt and the four options
+
+    Args:
+        query: Free-text search string
+        page: Page number (1-indexed)
+        per_page: Number of results per page
+
+    Returns:
+        Dictionary with ranked results and pagination info
+    """
+    tokens = _TOKEN_RE.findall((query or '').lower())
+    if not tokens:
+        return _paginate([], 0, page, per_page)
+
+    if search_index_supported():
+        total, results = _search_fts(_build_match_query(query), page, per_page)
+    else:
+        total, results = _search_like(tokens, page, per_page)
+
+    return _paginate(results, total, page, per_page)
@@ -1,15 +1,23 @@
+import asyncio
 import requests
 import os
 import json
+import secrets
+import threading
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from metrics import observe_upstream
 
 load_dotenv()
 
 _weather_cache = {}
 WEATHER_CACHE_TTL_HOURS = 6
 
-CITIES_CACHE_FILE = 'cache_cities.json'
+# Upstream results fetched by the async front end (asgi.py) for the current request
+_prefetched = ContextVar('weather_prefetched', default=None)
+
+CITIES_CACHE_FILE = os.getenv('CITIES_CACHE_FILE', 'cache_cities.json')
 CITIES_CACHE_TTL_DAYS = 30
 
 
@@ -26,14 +34,42 @@ def _load_cities_cache():
 
 def _save_cities_cache(cache_data):
     """Save city cache to disk"""
-    try:
-        with open(CITIES_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-    except IOError as e:
-        print(f"Error saving city cache: {e}")
+    # Serialize writers and dump a copy: other threads keep adding entries
+    with _cities_cache_lock:
+        snapshot = dict(cache_data)
+        try:
+            with open(CITIES_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        except IOError as e:
+            print(f"Error saving city cache: {e}")
+
+
+_cities_cache = None
+_cities_cache_lock = threading.Lock()
+
+DEFAULT_WEATHER_API_BASE_URL = 'http://api.weatherapi.com/v1'
 
 
-_cities_cache = _load_cities_cache()
+def _weather_api_url(endpoint):
+    """WeatherAPI.com endpoint URL; WEATHER_API_BASE_URL points it elsewhere (e.g. a local stub)"""
+    return f"{os.getenv('WEATHER_API_BASE_URL', DEFAULT_WEATHER_API_BASE_URL).rstrip('/')}/{endpoint}"
+
+
+def _get_cities_cache():
+    """City cache, read from disk on first use"""
+    global _cities_cache
+    if _cities_cache is None:
+        _cities_cache = _load_cities_cache()
+    return _cities_cache
+
+
+def is_admin_request(req):
+    """Check the X-Admin-Token header against ADMIN_TOKEN; admin endpoints are off when it is unset"""
+    expected = os.getenv('ADMIN_TOKEN')
+    if not expected:
+        return False
+    provided = req.headers.get('X-Admin-Token', '')
+    return secrets.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
 
 
 def _get_from_weather_cache(key):
@@ -52,23 +88,86 @@ def _set_weather_cache(key, value):
     _weather_cache[key] = (value, datetime.now())
 
 
+def _is_fresh_city_entry(entry):
+    return datetime.now() - datetime.fromisoformat(entry[1]) < timedelta(days=CITIES_CACHE_TTL_DAYS)
+
+
 def _get_from_cities_cache(key):
     """Get city from cache if still valid"""
-    if key in _cities_cache:
-        data, timestamp_str = _cities_cache[key]
-        timestamp = datetime.fromisoformat(timestamp_str)
-        if datetime.now() - timestamp < timedelta(days=CITIES_CACHE_TTL_DAYS):
-            return data
+    cities_cache = _get_cities_cache()
+    if key in cities_cache:
+        if _is_fresh_city_entry(cities_cache[key]):
+            return cities_cache[key][0]
         else:
-            del _cities_cache[key]
-            _save_cities_cache(_cities_cache)
+            del cities_cache[key]
+            _save_cities_cache(cities_cache)
+    return None
+
+
+async def _get_from_cities_cache_async(key):
+    """_get_from_cities_cache() for the event loop: hits come from memory, file I/O runs in a thread"""
+    entry = _cities_cache.get(key) if _cities_cache is not None else None
+    if entry is not None and _is_fresh_city_entry(entry):
+        return entry[0]
+    if _cities_cache is None or entry is not None:
+        # First use reads the file; an expired entry rewrites it
+        return await asyncio.to_thread(_get_from_cities_cache, key)
     return None
 
 
 def _set_cities_cache(key, value):
     """Save city to cache"""
-    _cities_cache[key] = (value, datetime.now().isoformat())
-    _save_cities_cache(_cities_cache)
+    cities_cache = _get_cities_cache()
+    cities_cache[key] = (value, datetime.now().isoformat())
+    _save_cities_cache(cities_cache)
+
+
+def _recall_prefetched(key):
+    """(found, value) for an upstream result the async front end already fetched for this request"""
+    prefetched = _prefetched.get()
+    if prefetched is not None and key in prefetched:
+        return True, prefetched[key]
+    return False, None
+
+
+def _remember_prefetched(key, value):
+    prefetched = _prefetched.get()
+    if prefetched is not None:
+        prefetched[key] = value
+
+
+def start_prefetch():
+    """
+    Collect the results of the async weather functions for the current
+    request, so the sync functions reuse them instead of calling WeatherAPI
+    again. Returns a token for end_prefetch().
+    """
+    return _prefetched.set({})
+
+
+def end_prefetch(token):
+    _prefetched.reset(token)
+
+
+def _is_valid_city_name(city_name):
+    return all(c.isalnum() or c.isspace() or c in '-,.' for c in city_name)
+
+
+def _parse_forecast(data):
+    """Turn a WeatherAPI forecast.json payload into the 3-day forecast list"""
+    forecast_list = []
+    day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    
+    for day in data['forecast']['forecastday']:
+        dt = datetime.strptime(day['date'], '%Y-%m-%d')
+        
+        forecast_list.append({
+            'date': day['date'],
+            'day_name': day_names[dt.weekday()],
+            'day_temp': round(day['day']['maxtemp_c']),
+            'night_temp': round(day['day']['mintemp_c'])
+        })
+    return forecast_list
 
 
 def search_cities_api(query, api_key=None):
@@ -80,15 +179,19 @@ def search_cities_api(query, api_key=None):
     cached = _get_from_cities_cache(cache_key)
     if cached is not None:
         return cached
+    found, prefetched = _recall_prefetched(cache_key)
+    if found:
+        return prefetched
     
     if api_key is None:
         api_key = os.getenv('WEATHER_API_KEY')
     
-    base_url = "http://api.weatherapi.com/v1/search.json"
+    base_url = _weather_api_url('search.json')
     params = {'key': api_key, 'q': query}
     
     try:
-        response = requests.get(base_url, params=params, timeout=5)
+        with observe_upstream('weatherapi', 'search'):
+            response = requests.get(base_url, params=params, timeout=5)
         response.raise_for_status()
         response.encoding = 'utf-8'
         results = response.json()
@@ -107,7 +210,7 @@ def get_weather_forecast(city_name, api_key=None, force_refresh=False):
     
     city_name = city_name.strip()
     
-    if not all(c.isalnum() or c.isspace() or c in '-,.' for c in city_name):
+    if not _is_valid_city_name(city_name):
         return None
 
     if api_key is None:
@@ -126,8 +229,11 @@ def get_weather_forecast(city_name, api_key=None, force_refresh=False):
         cached = _get_from_weather_cache(cache_key)
         if cached is not None:
             return cached
+    found, prefetched = _recall_prefetched(cache_key)
+    if found:
+        return prefetched
     
-    base_url = "http://api.weatherapi.com/v1/forecast.json"
+    base_url = _weather_api_url('forecast.json')
     params = {
         'key': api_key,
         'q': validated_city,
@@ -136,23 +242,11 @@ def get_weather_forecast(city_name, api_key=None, force_refresh=False):
     }
     
     try:
-        response = requests.get(base_url, params=params, timeout=10)
+        with observe_upstream('weatherapi', 'forecast'):
+            response = requests.get(base_url, params=params, timeout=10)
         response.raise_for_status()
         response.encoding = 'utf-8'
-        data = response.json()
-        
-        forecast_list = []
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        
-        for day in data['forecast']['forecastday']:
-            dt = datetime.strptime(day['date'], '%Y-%m-%d')
-            
-            forecast_list.append({
-                'date': day['date'],
-                'day_name': day_names[dt.weekday()],
-                'day_temp': round(day['day']['maxtemp_c']),
-                'night_temp': round(day['day']['mintemp_c'])
-            })
+        forecast_list = _parse_forecast(response.json())
         
         _set_weather_cache(cache_key, forecast_list)
         return forecast_list
@@ -163,3 +257,82 @@ def get_weather_forecast(city_name, api_key=None, force_refresh=False):
     except (KeyError, ValueError) as e:
         print(f"Error processing data: {e}")
         return None
+
+
+async def search_cities_api_async(query, client, api_key=None):
+    """search_cities_api() on an httpx.AsyncClient: waits on WeatherAPI without holding a thread"""
+    import httpx
+
+    if not query or len(query) < 2:
+        return []
+    
+    cache_key = f"search_{query.lower()}"
+    cached = await _get_from_cities_cache_async(cache_key)
+    if cached is not None:
+        return cached
+    
+    if api_key is None:
+        api_key = os.getenv('WEATHER_API_KEY')
+    
+    results = []
+    try:
+        with observe_upstream('weatherapi', 'search'):
+            response = await client.get(_weather_api_url('search.json'), params={'key': api_key, 'q': query},
+                                        timeout=5)
+        response.raise_for_status()
+        results = response.json()
+        await asyncio.to_thread(_set_cities_cache, cache_key, results)
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"Error searching cities: {e}")
+    _remember_prefetched(cache_key, results)
+    return results
+
+
+async def get_weather_forecast_async(city_name, client, api_key=None, force_refresh=False):
+    """get_weather_forecast() on an httpx.AsyncClient: waits on WeatherAPI without holding a thread"""
+    import httpx
+
+    if not city_name or not city_name.strip():
+        return None
+    
+    city_name = city_name.strip()
+    
+    if not _is_valid_city_name(city_name):
+        return None
+
+    if api_key is None:
+        api_key = os.getenv('WEATHER_API_KEY')
+    
+    search_results = await search_cities_api_async(city_name, client, api_key)
+    
+    if not search_results:
+        print(f"City not found: {city_name}")
+        return None
+    
+    validated_city = search_results[0]['name']
+    
+    cache_key = f"weather_{validated_city.lower()}"
+    if not force_refresh:
+        cached = _get_from_weather_cache(cache_key)
+        if cached is not None:
+            return cached
+    
+    forecast_list = None
+    params = {
+        'key': api_key,
+        'q': validated_city,
+        'days': 3,
+        'lang': 'it'
+    }
+    try:
+        with observe_upstream('weatherapi', 'forecast'):
+            response = await client.get(_weather_api_url('forecast.json'), params=params, timeout=10)
+        response.raise_for_status()
+        forecast_list = _parse_forecast(response.json())
+        _set_weather_cache(cache_key, forecast_list)
+    except httpx.HTTPError as e:
+        print(f"Error in API request: {e}")
+    except (KeyError, ValueError) as e:
+        print(f"Error processing data: {e}")
+    _remember_prefetched(cache_key, forecast_list)
+    return forecast_list
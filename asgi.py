@@ -0,0 +1,244 @@
+"""
+ASGI deployment mode: uvicorn asgi:application --workers 1
+
+Quiz rooms live in one process (see api.room_service), so this runs as a
+single worker. To add workers, every /api/rooms request must reach one
+dedicated single-worker instance.
+
+The Flask app runs unchanged in a bounded thread pool (ASGI_WSGI_THREADS).
+Requests that call WeatherAPI (POST /, POST /api/weather and
+GET /api/search-cities) are first counted against the Flask-Limiter
+limits; those within them wait for the upstream calls on the event loop
+using httpx, so a rate-limited client never spends WeatherAPI quota.
+Flask then handles them as usual (sessions, metrics; the limits are not
+counted twice) and takes the results from the cache or the per-request
+prefetch in api.services, so a slow WeatherAPI ties up sockets, not
+worker threads.
+
+Quiz room event streams (GET /api/rooms/<code>/events) are served here
+directly from the room manager, so each listener is a socket waiting on
+the event loop rather than a Flask thread blocked for the whole round.
+Opening one still goes through a Flask request context: the app's session
+interface, the rate limits and the request metrics, like any other route.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qs
+import bleach
+import httpx
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request, session
+from flask_limiter import RateLimitExceeded
+from app import create_app
+from metrics import REQUESTS, REQUEST_LATENCY, ROOM_STREAMS
+from views import limiter, limits_counted
+from api.services import start_prefetch, end_prefetch, search_cities_api_async, get_weather_forecast_async
+from api.room_service import get_room, KEEPALIVE_SECONDS
+
+MAX_PREFETCH_BODY = 64 * 1024
+
+flask_app = create_app()
+wsgi = WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_WSGI_THREADS', '16')))
+_client = None
+
+
+def _get_client():
+    """Shared HTTP client for upstream calls, created inside the running event loop"""
+    global _client
+    if _client is None:
+        limit = int(os.getenv('WEATHER_MAX_CONNECTIONS', '1000'))
+        _client = httpx.AsyncClient(limits=httpx.Limits(max_connections=limit, max_keepalive_connections=100))
+    return _client
+
+
+async def _read_body(receive):
+    body, more = b'', True
+    while more:
+        message = await receive()
+        body += message.get('body', b'')
+        more = message.get('more_body', False)
+        if len(body) > MAX_PREFETCH_BODY:
+            break
+    return body, more
+
+
+def _replay(body, more, receive):
+    """receive() that hands the already-read body to the WSGI app first"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': more}
+        return await receive()
+
+    return replay
+
+
+async def _prefetch(method, path, scope, body):
+    """Run the upstream calls the Flask view is about to make"""
+    client = _get_client()
+    if method == 'GET' and path == '/api/search-cities':
+        query = parse_qs(scope['query_string'].decode('latin-1')).get('q', [''])[0].strip()
+        await search_cities_api_async(query, client)
+    elif method == 'POST' and path == '/api/weather':
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            return
+        if isinstance(data, dict) and isinstance(data.get('city'), str):
+            await get_weather_forecast_async(data['city'], client)
+    elif method == 'POST' and path == '/':
+        form = parse_qs(body.decode('utf-8', 'replace'))
+        city = bleach.clean(form.get('city', [''])[0].strip(), tags=[], strip=True)
+        if city and len(city) <= 100:
+            await get_weather_forecast_async(city, client, force_refresh=form.get('force_refresh', [''])[0] == '1')
+
+
+def _within_limits():
+    """
+    Count the current request against the limits with Flask-Limiter's own
+    before_request check (it has no public one); False when it is over them.
+    """
+    try:
+        limiter._check_request_limit(in_middleware=True)
+    except RateLimitExceeded:
+        return False
+    return True
+
+
+def _count_request_limits(scope):
+    with flask_app.request_context(build_environ(scope, io.BytesIO())):
+        return _within_limits()
+
+
+PREFETCH_ROUTES = {('GET', '/api/search-cities'), ('POST', '/api/weather'), ('POST', '/')}
+ROOM_EVENTS_PATH = re.compile(r'^/api/rooms/([A-Za-z0-9]+)/events$')
+
+
+async def _send_json(send, status, data):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _open_room_stream(scope, code):
+    """
+    The Flask route's checks in a request context of the app, so the
+    session comes from its session interface and the rate limits apply:
+    (status, error, room, last event id, endpoint)
+    """
+    with flask_app.request_context(build_environ(scope, io.BytesIO())):
+        endpoint = request.endpoint or 'unmatched'
+        if not _within_limits():
+            return 429, 'Too many requests', None, 0, endpoint
+        user_id = session.get('user_id')
+        room = get_room(code)
+        if not user_id:
+            return 401, 'Unauthorized', None, 0, endpoint
+        if room is None:
+            return 404, 'Room not found', None, 0, endpoint
+        if not room.can_listen(user_id):
+            return 403, 'Join the room first', None, 0, endpoint
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or '0'
+        if not last_event_id.isdigit():
+            return 400, 'Invalid Last-Event-ID', None, 0, endpoint
+        return 200, None, room, int(last_event_id), endpoint
+
+
+async def _room_events(scope, receive, send, code):
+    """SSE stream of a room's events; same checks and output as the Flask route"""
+    start = time.perf_counter()
+    status, error, room, last_event_id, endpoint = await asyncio.to_thread(_open_room_stream, scope, code)
+    if flask_app.config['METRICS_ENABLED']:
+        # Like the Flask route: counted when the response starts
+        REQUESTS.inc((endpoint, 'GET', str(status)))
+        REQUEST_LATENCY.observe(time.perf_counter() - start, (endpoint,))
+    if error:
+        return await _send_json(send, status, {'error': error})
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+    await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    room.add_waiter(loop, wakeup)
+    ROOM_STREAMS.inc()
+    try:
+        while True:
+            wakeup.clear()
+            events, closed = room.events_after(last_event_id)
+            if events:
+                last_event_id = events[-1].id
+                body = ''.join(event.text for event in events).encode('utf-8')
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            if closed:
+                break
+            if events:
+                continue
+            woken = asyncio.ensure_future(wakeup.wait())
+            done, _ = await asyncio.wait({woken, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if disconnected in done:
+                return
+            if not done:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        ROOM_STREAMS.dec()
+        room.remove_waiter(loop, wakeup)
+        disconnected.cancel()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if _client is not None:
+                    await _client.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    route = (scope.get('method'), scope.get('path'))
+    if scope['type'] == 'http' and route[0] == 'GET':
+        match = ROOM_EVENTS_PATH.match(route[1])
+        if match:
+            await _room_events(scope, receive, send, match.group(1))
+            return
+
+    if scope['type'] != 'http' or route not in PREFETCH_ROUTES:
+        await wsgi(scope, receive, send)
+        return
+
+    body, more = (b'', False) if route[0] == 'GET' else await _read_body(receive)
+    # Over the limits: skip the prefetch and let Flask count the request again and answer 429
+    counted = limiter.enabled and await asyncio.to_thread(_count_request_limits, scope)
+    counted_token = limits_counted.set(counted)
+    token = start_prefetch()
+    try:
+        if not more and (counted or not limiter.enabled):
+            await _prefetch(route[0], route[1], scope, body)
+        await wsgi(scope, _replay(body, more, receive), send)
+    finally:
+        end_prefetch(token)
+        limits_counted.reset(counted_token)
@@ -0,0 +1,146 @@
+"""
+Static asset pipeline and response compression.
+
+`python manage.py build-assets` copies every CSS/JS file under static/ to
+static/dist/ with a content hash in its name (style/main.css ->
+dist/style/main.3f9a0c1b2d4e.css), writes gzip and brotli variants next to
+each copy, and records the mapping in static/dist/manifest.json.
+
+When the manifest exists, url_for('static', filename='style/main.css')
+points at the hashed copy. Hashed URLs are served with a one-year
+`Cache-Control: immutable` and the best precompressed variant the client
+accepts. Without a manifest (or in debug mode) static files are served
+as-is.
+
+HTML and JSON responses larger than COMPRESS_MIN_SIZE bytes are gzipped on
+the fly. Pages embed the CSRF token masked afresh for each response (see
+csrf.py), so compression does not expose it.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+DIST_DIR = 'dist'
+MANIFEST_FILE = 'manifest.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = ('text/html', 'application/json')
+
+# Preferred first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def build_assets(static_folder):
+    """
+    Fingerprint and precompress static assets into static/dist/
+
+    Returns:
+        Manifest dictionary mapping source names to hashed names
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("brotli is not installed; writing gzip variants only")
+
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in sorted(files):
+            if not name.endswith(ASSET_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            stem, extension = os.path.splitext(relative)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[relative] = hashed
+
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Read static/dist/manifest.json; empty when assets have not been built"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def init_assets(app):
+    """Serve fingerprinted assets and compress large HTML/JSON responses"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('COMPRESS_MIN_SIZE', '1024')))
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    manifest = {} if app.debug else load_manifest(app.static_folder)
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        """Point url_for('static', ...) at the hashed copy of an asset"""
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = f"{DIST_DIR}/{manifest[values['filename']]}"
+
+    @app.route(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', endpoint='hashed_static')
+    def hashed_static(filename):
+        """Serve a hashed asset, precompressed when the client allows it"""
+        path = safe_join(dist, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        for candidate, suffix in PRECOMPRESSED:
+            if request.accept_encodings[candidate] > 0 and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+    @app.after_request
+    def compress_response(response):
+        """Gzip HTML and JSON bodies above COMPRESS_MIN_SIZE"""
+        if (response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough
+                or response.is_streamed or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings['gzip'] <= 0:
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,58 @@
+"""Helpers shared by the benchmark scripts"""
+import os
+import tempfile
+import time
+from flask import Flask
+from db.tables import db
+from db.init_db import init_db
+from db.config import configure_database
+
+# Services render fragments from the app's templates
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+def make_app(db_uri=None, **config):
+    """Build a bare Flask app bound to its own database (a temp SQLite file by default)"""
+    if db_uri is None:
+        fd, path = tempfile.mkstemp(prefix='quiz_bench_', suffix='.db')
+        os.close(fd)
+        os.remove(path)
+        db_uri = f'sqlite:///{path}'
+
+    app = Flask(__name__, template_folder=TEMPLATE_FOLDER)
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config.update(config)
+    configure_database(app)
+    init_db(app)
+    return app
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def time_calls(func, repeat):
+    """Call func `repeat` times; return sorted per-call latencies in milliseconds"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def summarize(latencies):
+    """p50/p95/p99 summary of sorted latencies in milliseconds"""
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
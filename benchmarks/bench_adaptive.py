@@ -0,0 +1,86 @@
+"""
+Benchmark adaptive question selection on a synthetic in-memory state.
+
+Measures RatingEngine.select_question_id() and record_answer() against a
+linear scan for the closest unanswered question, and selection for players
+who have answered nearly the whole bank (--answered-most).
+
+    python -m benchmarks.bench_adaptive --questions 5000 --users 100000
+"""
+import argparse
+import json
+import random
+from benchmarks._common import time_calls, summarize
+from api.adaptive_service import RatingEngine, DEFAULT_RATING, TARGET_OFFSET
+
+
+def build_engine(questions, users, answered_per_user, seed=42):
+    rng = random.Random(seed)
+    engine = RatingEngine()
+    for question_id in range(1, questions + 1):
+        engine.add_question(question_id, rng.gauss(DEFAULT_RATING, 200))
+    for user_id in range(1, users + 1):
+        engine.answered[user_id] = set(rng.sample(range(1, questions + 1), answered_per_user))
+    engine.loaded = True
+    # No database here: never replay other processes' attempts
+    engine._refreshed_at = float('inf')
+    return engine, rng
+
+
+def linear_scan(engine, user_id):
+    """Baseline: closest unanswered question by scanning every rating"""
+    target = engine.user_rating(user_id) + TARGET_OFFSET
+    answered = engine.answered[user_id]
+    best, best_distance = None, None
+    for question_id, rating in enumerate(engine.question_ratings):
+        if rating != rating or question_id in answered:
+            continue
+        distance = abs(rating - target)
+        if best is None or distance < best_distance:
+            best, best_distance = question_id, distance
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--answered', type=int, default=50, help='Questions already answered per user')
+    parser.add_argument('--answered-most', type=float, default=0.95,
+                        help='Share of the bank answered by the "veteran" players')
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    engine, rng = build_engine(args.questions, args.users, args.answered)
+    veterans = range(args.users + 1, args.users + 101)
+    for user_id in veterans:
+        engine.answered[user_id] = set(rng.sample(range(1, args.questions + 1),
+                                                  int(args.questions * args.answered_most)))
+
+    def select():
+        engine.select_question_id(rng.randint(1, args.users))
+
+    def answer():
+        user_id = rng.randint(1, args.users)
+        question_id = engine.select_question_id(user_id)
+        engine.record_answer(user_id, question_id, rng.random() < 0.6)
+
+    def select_veteran():
+        engine.select_question_id(rng.choice(veterans))
+
+    def scan():
+        linear_scan(engine, rng.randint(1, args.users))
+
+    print(json.dumps({
+        'questions': args.questions,
+        'users': args.users,
+        'buckets': len(engine.buckets),
+        'select': summarize(time_calls(select, args.repeat)),
+        'select_and_record': summarize(time_calls(answer, args.repeat)),
+        'select_answered_most': summarize(time_calls(select_veteran, args.repeat)),
+        'linear_scan': summarize(time_calls(scan, max(1, args.repeat // 100))),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Weather endpoints against a deliberately slow upstream: WSGI threads vs the
+ASGI mode (asgi.py).
+
+A local WeatherAPI stub answers every call after --stub-latency-ms. A burst
+of --weather-requests POST /api/weather calls (each a search plus a
+forecast, all for distinct cities) runs alongside --probe-requests
+GET /api/leaderboard calls, which need no network.
+
+  * wsgi: requests go to the Flask app through a pool of --threads worker
+    threads, like a threaded WSGI server.
+  * asgi: requests go to asgi.application, which waits on WeatherAPI on the
+    event loop and hands Flask the results; Flask runs in the same number
+    of threads (ASGI_WSGI_THREADS).
+
+Reports weather throughput, probe latency (including time queued for a
+thread) and peak thread count as JSON.
+
+    python -m benchmarks.bench_async_weather --stub-latency-ms 2000 --weather-requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks._common import summarize
+from benchmarks.bench_load import start_weather_stub
+
+
+def _app_threads():
+    """Live threads, not counting the stub server's per-connection threads"""
+    return sum(1 for thread in threading.enumerate() if 'process_request_thread' not in thread.name)
+
+
+class ThreadPeak:
+    """Samples the application's thread count in the background"""
+
+    def __init__(self):
+        self.peak = _app_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, _app_threads())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _report(weather, probes, elapsed, errors, peak_threads):
+    return {
+        'weather': dict(summarize(sorted(weather)), throughput_rps=round(len(weather) / elapsed, 1)),
+        'probe': summarize(sorted(probes)),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 2),
+        'peak_threads': peak_threads,
+    }
+
+
+def run_wsgi(args):
+    from app import create_app
+
+    app = create_app({'RATELIMIT_ENABLED': False})
+    app.test_client().get('/api/leaderboard')  # initialize the database outside the measurement
+    weather, probes, errors = [], [], []
+    lock = threading.Lock()
+
+    def call(kind, index, submitted):
+        client = app.test_client()
+        if kind == 'weather':
+            response = client.post('/api/weather', json={'city': f'Town wsgi {index}'})
+        else:
+            response = client.get('/api/leaderboard')
+        elapsed = (time.perf_counter() - submitted) * 1000
+        with lock:
+            (weather if kind == 'weather' else probes).append(elapsed)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    with ThreadPeak() as threads, ThreadPoolExecutor(max_workers=args.threads) as pool:
+        start = time.perf_counter()
+        for i in range(max(args.weather_requests, args.probe_requests)):
+            now = time.perf_counter()
+            if i < args.weather_requests:
+                pool.submit(call, 'weather', i, now)
+            if i < args.probe_requests:
+                pool.submit(call, 'probe', i, now)
+        pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - start
+    return _report(weather, probes, elapsed, len(errors), threads.peak)
+
+
+async def _run_asgi(args):
+    import httpx
+    import asgi
+
+    transport = httpx.ASGITransport(app=asgi.application)
+    weather, probes, errors = [], [], []
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        await client.get('/api/leaderboard')
+
+        async def call(kind, index):
+            submitted = time.perf_counter()
+            if kind == 'weather':
+                response = await client.post('/api/weather', json={'city': f'Town asgi {index}'})
+            else:
+                response = await client.get('/api/leaderboard')
+            (weather if kind == 'weather' else probes).append((time.perf_counter() - submitted) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+        with ThreadPeak() as threads:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(call('weather', i) for i in range(args.weather_requests)),
+                *(call('probe', i) for i in range(args.probe_requests)),
+            )
+            elapsed = time.perf_counter() - start
+    return _report(weather, probes, elapsed, len(errors), threads.peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stub-latency-ms', type=float, default=1000)
+    parser.add_argument('--weather-requests', type=int, default=200)
+    parser.add_argument('--probe-requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help='Worker threads in both modes')
+    args = parser.parse_args()
+
+    stub = start_weather_stub(args.stub_latency_ms)
+    fd, db_path = tempfile.mkstemp(prefix='quiz_async_', suffix='.db')
+    os.close(fd)
+    os.remove(db_path)
+    cities_cache = db_path + '.cities.json'
+    # Read by create_app() and api.services, both imported below
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SECRET_KEY': 'benchmark',
+        'WEATHER_API_BASE_URL': f'http://127.0.0.1:{stub.server_port}/v1',
+        'WEATHER_API_KEY': 'benchmark',
+        'CITIES_CACHE_FILE': cities_cache,
+        'ASGI_WSGI_THREADS': str(args.threads),
+        'METRICS_ENABLED': 'off',
+    })
+    try:
+        result = {
+            'config': vars(args),
+            'wsgi': run_wsgi(args),
+            'asgi': asyncio.run(_run_asgi(args)),
+        }
+    finally:
+        stub.shutdown()
+        for path in (db_path, db_path + '-wal', db_path + '-shm', cities_cache):
+            if os.path.exists(path):
+                os.remove(path)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
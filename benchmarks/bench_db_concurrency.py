@@ -0,0 +1,99 @@
+"""
+Mixed read/write throughput on SQLite, with and without the engine profile.
+
+Writer threads submit answers while reader threads page through the
+leaderboard and look up ranks. Runs once with SQLITE_PRAGMAS off (default
+rollback journal) and once with the tuned profile (WAL, busy_timeout, ...).
+
+    python -m benchmarks.bench_db_concurrency --writers 4 --readers 8 --seconds 10
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from sqlalchemy import insert
+from benchmarks._common import make_app
+from db.tables import db, User, Question
+from api.quiz_service import submit_answer
+from api.leaderboard_service import get_leaderboard, get_user_rank
+
+
+def seed(users, questions):
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'nickname': f'player{i}', 'password_hash': '-', 'total_score': 0}
+        for i in range(users)
+    ])
+    db.session.execute(insert(Question), [
+        {'prompt': f'Question {i}?', 'option_a': 'a', 'option_b': 'b', 'option_c': 'c',
+         'option_d': 'd', 'correct_option': 'abcd'[i % 4]}
+        for i in range(questions)
+    ])
+    db.session.commit()
+
+
+def run(profile, args):
+    app = make_app(SQLITE_PRAGMAS=(profile == 'tuned'))
+    with app.app_context():
+        seed(args.users, args.questions)
+
+    counts = {'writes': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(kind, seed_value):
+        rng = random.Random(seed_value)
+        done = errors = 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    if kind == 'writes':
+                        ok, _, _ = submit_answer(rng.randint(1, args.users), rng.randint(1, args.questions),
+                                                 rng.choice('abcd'))
+                        if not ok:
+                            raise RuntimeError('submit failed')
+                    else:
+                        get_leaderboard(rng.randint(1, 5), 50)
+                        get_user_rank(rng.randint(1, args.users))
+                    done += 1
+                except Exception:
+                    db.session.rollback()
+                    errors += 1
+                db.session.remove()
+        with lock:
+            counts[kind] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=('writes', i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('reads', 100 + i)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'writes_per_s': round(counts['writes'] / args.seconds, 1),
+        'reads_per_s': round(counts['reads'] / args.seconds, 1),
+        'errors': counts['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=200)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        'writers': args.writers,
+        'readers': args.readers,
+        'default': run('default', args),
+        'tuned': run('tuned', args),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark item analysis on synthetic attempts.
+
+Times compute_item_sums()/derive_item_statistics() on N synthetic attempts
+and a straightforward per-attempt Python loop on a sample, extrapolated.
+The same attempts are then written to a temporary SQLite database, and a
+whole analysis run is timed: load_attempts() (rows to arrays) plus the
+kernel. Skip that stage with --no-db.
+
+    python -m benchmarks.bench_item_analysis --attempts 10000000
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from api.analytics_service import load_attempts, compute_item_sums, derive_item_statistics
+from benchmarks._common import make_app
+
+
+def generate_attempts(attempts, questions, users, seed=42):
+    """Synthetic attempts where stronger players answer correctly more often"""
+    rng = np.random.default_rng(seed)
+    user_skill = rng.normal(0, 1, users)
+    question_difficulty = rng.normal(0, 1, questions)
+
+    user = rng.integers(0, users, attempts)
+    question = rng.integers(0, questions, attempts)
+    probability = 1 / (1 + np.exp(question_difficulty[question] - user_skill[user]))
+    correct = rng.random(attempts) < probability
+    answer = rng.integers(0, 4, attempts).astype(np.int8)
+    ability = np.round((user_skill[user] + 3) * 100)
+    return question + 1, correct, answer, ability
+
+
+def python_loop(question_id, correct, answer, ability):
+    """Reference implementation: one dict update per attempt"""
+    sums = {}
+    for q, x, a, t in zip(question_id.tolist(), correct.tolist(), answer.tolist(), ability.tolist()):
+        s = sums.setdefault(q, [0, 0, 0.0, 0.0, 0.0, 0, 0, 0, 0])
+        s[0] += 1
+        s[1] += x
+        s[2] += t
+        s[3] += t * t
+        s[4] += x * t
+        if a >= 0:
+            s[5 + a] += 1
+    return sums
+
+
+def write_attempts(db, question_id, correct, answer, users, chunk_size=500000):
+    """Users (ability as total score), questions and one Score row per synthetic attempt"""
+    rng = np.random.default_rng(7)
+    questions = int(question_id.max())
+    user_id = rng.integers(1, users + 1, len(question_id))
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, username, nickname, password_hash, total_score, created_at) "
+            "VALUES (?, ?, ?, '-', ?, '2025-01-01 00:00:00')",
+            [(i, f'user{i}', f'player{i}', int(score))
+             for i, score in enumerate(rng.integers(0, 5000, users).tolist(), start=1)]
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO questions (id, prompt, option_a, option_b, option_c, option_d, correct_option, created_at) "
+            "VALUES (?, ?, 'A', 'B', 'C', 'D', 'a', '2025-01-01 00:00:00')",
+            [(i, f'Question {i}') for i in range(1, questions + 1)]
+        )
+    letters = np.array(list('abcd'))
+    for start in range(0, len(question_id), chunk_size):
+        end = start + chunk_size
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO scores (user_id, question_id, correct, answer, points, timestamp) "
+                "VALUES (?, ?, ?, ?, 0, '2025-01-01 00:00:00')",
+                list(zip(user_id[start:end].tolist(), question_id[start:end].tolist(),
+                         correct[start:end].tolist(), letters[answer[start:end]].tolist()))
+            )
+
+
+def time_database_run(question_id, correct, answer, users):
+    """Seconds for load_attempts() plus the kernel over the attempts stored in SQLite"""
+    from db.tables import db
+
+    app = make_app()
+    path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    try:
+        with app.app_context():
+            write_attempts(db, question_id, correct, answer, users)
+            start = time.perf_counter()
+            attempts = load_attempts()
+            loaded = time.perf_counter() - start
+            _, sums = compute_item_sums(
+                attempts['question_id'], attempts['correct'], attempts['answer'], attempts['ability']
+            )
+            derive_item_statistics(sums)
+            total = time.perf_counter() - start
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return loaded, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=10_000_000)
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--loop-sample', type=int, default=500_000)
+    parser.add_argument('--no-db', action='store_true', help='Only time the kernel, not loading from SQLite')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    question_id, correct, answer, ability = generate_attempts(args.attempts, args.questions, args.users)
+    generated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, sums = compute_item_sums(question_id, correct, answer, ability)
+    p_value, discrimination = derive_item_statistics(sums)
+    vectorized = time.perf_counter() - start
+
+    sample = min(args.loop_sample, args.attempts)
+    start = time.perf_counter()
+    python_loop(question_id[:sample], correct[:sample], answer[:sample], ability[:sample])
+    loop = (time.perf_counter() - start) * args.attempts / sample
+
+    report = {
+        'attempts': args.attempts,
+        'questions': args.questions,
+        'generate_s': round(generated, 2),
+        'vectorized_s': round(vectorized, 3),
+        'python_loop_s_extrapolated': round(loop, 2),
+        'speedup': round(loop / vectorized, 1),
+        'mean_p_value': round(float(np.nanmean(p_value)), 4),
+        'mean_discrimination': round(float(np.nanmean(discrimination)), 4),
+    }
+    if not args.no_db:
+        loaded, total = time_database_run(question_id, correct, answer, args.users)
+        report.update(load_attempts_s=round(loaded, 2), database_run_s=round(total, 2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
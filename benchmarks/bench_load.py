@@ -0,0 +1,332 @@
+"""
+Synthetic-load benchmark over the main routes.
+
+Generates a dataset straight into a SQLite file (users, questions and
+score history at the requested scale), starts a local WeatherAPI stub,
+then drives the full application from concurrent logged-in clients:
+
+    GET /quiz, POST /api/quiz/answer, GET /leaderboard, GET /api/leaderboard,
+    GET /profile, GET /api/search-cities
+
+Requests go through the WSGI app in-process (Flask test clients), so the
+numbers cover the application and database, not an HTTP server. The result
+is JSON with throughput and p50/p95/p99 latency per endpoint; keep one per
+release and pass it to --compare.
+
+    python -m benchmarks.bench_load --users 100000 --questions 5000 --scores 10000000 \\
+        --db /tmp/quiz_load.db --keep-db --seconds 30 --output load.json
+    python -m benchmarks.bench_load --db /tmp/quiz_load.db --reuse --compare load.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from werkzeug.security import generate_password_hash
+from benchmarks._common import summarize
+
+PASSWORD = 'benchmark-password'
+
+# Endpoint -> relative weight in the request mix
+MIX = {
+    'GET /quiz': 3,
+    'POST /api/quiz/answer': 3,
+    'GET /leaderboard': 2,
+    'GET /api/leaderboard': 2,
+    'GET /profile': 1,
+    'GET /api/search-cities': 1,
+}
+
+CITIES = [
+    ('Rome', 'Italy'), ('Milan', 'Italy'), ('Naples', 'Italy'), ('Turin', 'Italy'), ('Palermo', 'Italy'),
+    ('Genoa', 'Italy'), ('Bologna', 'Italy'), ('Florence', 'Italy'), ('Paris', 'France'), ('Lyon', 'France'),
+    ('Berlin', 'Germany'), ('Munich', 'Germany'), ('Madrid', 'Spain'), ('Barcelona', 'Spain'),
+    ('London', 'United Kingdom'), ('Manchester', 'United Kingdom'), ('Lisbon', 'Portugal'),
+    ('Vienna', 'Austria'), ('Zurich', 'Switzerland'), ('Amsterdam', 'Netherlands'),
+]
+
+
+class WeatherStubHandler(BaseHTTPRequestHandler):
+    """Answers /v1/search.json and /v1/forecast.json like WeatherAPI.com"""
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get('q', [''])[0].lower()
+        time.sleep(self.latency)
+        if url.path.endswith('/search.json'):
+            body = [{'name': name, 'country': country} for name, country in CITIES
+                    if name.lower().startswith(query)]
+            if not body and query.startswith('town'):
+                body = [{'name': query.title(), 'country': 'Stubland'}]
+        elif url.path.endswith('/forecast.json'):
+            today = datetime.utcnow().date()
+            body = {'forecast': {'forecastday': [
+                {'date': (today + timedelta(days=i)).isoformat(), 'day': {'maxtemp_c': 20 + i, 'mintemp_c': 10 + i}}
+                for i in range(3)
+            ]}}
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class WeatherStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_weather_stub(latency_ms):
+    WeatherStubHandler.latency = latency_ms / 1000
+    server = WeatherStubServer(('127.0.0.1', 0), WeatherStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def generate_dataset(db, users, questions, scores, chunk_size=200000, seed=1):
+    """Bulk-insert a synthetic dataset and derive users.total_score from it"""
+    from db.search_index import rebuild_search_index
+
+    rng = np.random.default_rng(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    now = datetime.utcnow()
+
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            'INSERT INTO users (id, username, nickname, password_hash, total_score, created_at) '
+            'VALUES (?, ?, ?, ?, 0, ?)',
+            [(i, f'user{i}', f'player{i}', password_hash, now.strftime('%Y-%m-%d %H:%M:%S.%f'))
+             for i in range(1, users + 1)]
+        )
+        conn.exec_driver_sql(
+            'INSERT INTO questions (id, prompt, option_a, option_b, option_c, option_d, correct_option, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(i, f'Synthetic question {i}: which option is right?', 'Option A', 'Option B', 'Option C',
+              'Option D', 'abcd'[i % 4], now.strftime('%Y-%m-%d %H:%M:%S.%f'))
+             for i in range(1, questions + 1)]
+        )
+
+    # Per-question difficulty; a few very active users, a long tail of casual ones
+    p_correct = rng.uniform(0.3, 0.9, questions + 1)
+    start = now - timedelta(days=365)
+    letters = np.array(list('abcd'))
+    written = 0
+    while written < scores:
+        n = min(chunk_size, scores - written)
+        user_ids = (users * rng.random(n) ** 3).astype(np.int64) + 1
+        question_ids = rng.integers(1, questions + 1, n)
+        correct = rng.random(n) < p_correct[question_ids]
+        right = question_ids % 4
+        answers = letters[np.where(correct, right, (right + rng.integers(1, 4, n)) % 4)]
+        offsets = np.sort(rng.uniform(written / scores, (written + n) / scores, n)) * 365 * 86400
+        timestamps = [(start + timedelta(seconds=s)).strftime('%Y-%m-%d %H:%M:%S.%f') for s in offsets.tolist()]
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                'INSERT INTO scores (user_id, question_id, correct, answer, points, timestamp) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                list(zip(user_ids.tolist(), question_ids.tolist(), correct.tolist(), answers.tolist(),
+                         (correct * 10).tolist(), timestamps))
+            )
+        written += n
+        print(f'  {written}/{scores} scores', end='\r', flush=True)
+
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            'UPDATE users SET total_score = 10 * (SELECT COUNT(DISTINCT question_id) FROM scores '
+            'WHERE scores.user_id = users.id AND scores.correct = 1)'
+        )
+    rebuild_search_index()
+    print()
+
+
+def run_load(app, args, total_users, total_questions):
+    """Drive the request mix from args.concurrency clients; return per-endpoint latencies"""
+    endpoints = list(MIX)
+    weights = [MIX[name] for name in endpoints]
+    latencies = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    lock = threading.Lock()
+    prefixes = sorted({name[:length].lower() for name, _ in CITIES for length in (2, 3, 4)})
+    leaderboard_pages = max(1, (total_users + 49) // 50)
+
+    clients = []
+    for i in range(args.concurrency):
+        client = app.test_client()
+        response = client.post('/api/login', json={'username': f'user{1 + i * total_users // args.concurrency}',
+                                                   'password': PASSWORD})
+        if response.status_code != 200:
+            raise SystemExit(f'login failed: {response.get_json()}')
+        clients.append(client)
+
+    def request(client, rng, name):
+        if name == 'GET /quiz':
+            return client.get('/quiz')
+        if name == 'POST /api/quiz/answer':
+            return client.post('/api/quiz/answer', json={'question_id': rng.randint(1, total_questions),
+                                                         'answer': rng.choice('abcd')})
+        page = 1 + int(leaderboard_pages * rng.random() ** 3)
+        if name == 'GET /leaderboard':
+            return client.get(f'/leaderboard?page={page}')
+        if name == 'GET /api/leaderboard':
+            return client.get(f'/api/leaderboard?page={page}&per_page=50')
+        if name == 'GET /profile':
+            return client.get('/profile')
+        return client.get(f'/api/search-cities?q={rng.choice(prefixes)}')
+
+    def worker(index, deadline, record):
+        rng = random.Random(index)
+        client = clients[index]
+        own = {name: [] for name in endpoints}
+        own_errors = {name: 0 for name in endpoints}
+        while time.perf_counter() < deadline:
+            name = rng.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            response = request(client, rng, name)
+            response.get_data()
+            elapsed = (time.perf_counter() - start) * 1000
+            own[name].append(elapsed)
+            if response.status_code >= 400:
+                own_errors[name] += 1
+        if record:
+            with lock:
+                for name in endpoints:
+                    latencies[name].extend(own[name])
+                    errors[name] += own_errors[name]
+
+    for seconds, record in ((args.warmup, False), (args.seconds, True)):
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=worker, args=(i, deadline, record)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = {}
+    for name in endpoints:
+        values = sorted(latencies[name])
+        results[name] = dict(summarize(values), errors=errors[name],
+                             throughput_rps=round(len(values) / args.seconds, 1))
+    return results
+
+
+def compare(results, baseline_path):
+    """Print throughput and p95 change per endpoint against a previous result file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['endpoints']
+    print(f"\n{'endpoint':<26} {'rps':>9} {'Δ rps':>8} {'p95 ms':>9} {'Δ p95':>8}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<26} {current['throughput_rps']:>9} {'new':>8} {current['p95_ms']:>9} {'new':>8}")
+            continue
+        rps_change = (current['throughput_rps'] / before['throughput_rps'] - 1) * 100 if before['throughput_rps'] else 0
+        p95_change = (current['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0
+        print(f"{name:<26} {current['throughput_rps']:>9} {rps_change:>+7.1f}% "
+              f"{current['p95_ms']:>9} {p95_change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--scores', type=int, default=500000)
+    parser.add_argument('--db', help='SQLite file for the dataset (default: temporary file)')
+    parser.add_argument('--reuse', action='store_true', help='Use the existing dataset in --db as-is')
+    parser.add_argument('--keep-db', action='store_true', help='Do not delete --db afterwards')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--stub-latency-ms', type=float, default=50, help='Delay added by the WeatherAPI stub')
+    parser.add_argument('--output', '-o', help='Write the JSON result here as well as to stdout')
+    parser.add_argument('--compare', help='Previous JSON result to compare against')
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = os.path.abspath(args.db)
+    else:
+        fd, db_path = tempfile.mkstemp(prefix='quiz_load_', suffix='.db')
+        os.close(fd)
+        os.remove(db_path)
+    if os.path.exists(db_path) and not args.reuse:
+        raise SystemExit(f'{db_path} already exists; pass --reuse to benchmark it as-is')
+    cities_cache = tempfile.NamedTemporaryFile(prefix='quiz_load_cities_', suffix='.json', delete=False).name
+    os.remove(cities_cache)
+
+    stub = start_weather_stub(args.stub_latency_ms)
+    # Read by api.services, which create_app() imports
+    os.environ['WEATHER_API_BASE_URL'] = f'http://127.0.0.1:{stub.server_port}/v1'
+    os.environ['WEATHER_API_KEY'] = 'benchmark'
+    os.environ['CITIES_CACHE_FILE'] = cities_cache
+
+    from app import create_app
+    from db.init_db import ensure_db
+    from db.tables import db, User, Question, Score
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SECRET_KEY': 'benchmark',
+        'RATELIMIT_ENABLED': False,
+    })
+    try:
+        ensure_db(app)
+        with app.app_context():
+            if not args.reuse:
+                print(f'Generating {args.users} users, {args.questions} questions, {args.scores} scores...')
+                start = time.perf_counter()
+                generate_dataset(db, args.users, args.questions, args.scores)
+                print(f'Dataset ready in {time.perf_counter() - start:.1f}s')
+            dataset = {
+                'users': db.session.query(User).count(),
+                'questions': db.session.query(Question).count(),
+                'scores': db.session.query(Score).count(),
+            }
+            db.session.remove()
+
+        endpoints = run_load(app, args, dataset['users'], dataset['questions'])
+        result = {
+            'benchmark': 'bench_load',
+            'dataset': dataset,
+            'config': {
+                'concurrency': args.concurrency,
+                'seconds': args.seconds,
+                'warmup': args.warmup,
+                'stub_latency_ms': args.stub_latency_ms,
+                'mix': MIX,
+                'python': platform.python_version(),
+            },
+            'endpoints': endpoints,
+            'total_rps': round(sum(e['throughput_rps'] for e in endpoints.values()), 1),
+        }
+        print(json.dumps(result, indent=2))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+        if args.compare:
+            compare(endpoints, args.compare)
+    finally:
+        stub.shutdown()
+        if os.path.exists(cities_cache):
+            os.remove(cities_cache)
+        if not args.keep_db and not args.reuse:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
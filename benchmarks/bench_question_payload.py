@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: serving a question from the ORM vs the payload cache.
+
+  * orm: load the Question through the ORM (with an empty identity map,
+    as in a new request), build the JSON response with jsonify() and
+    render the answer options markup.
+  * cached: api.question_cache.get_payload() and a Response around the
+    stored JSON bytes; the options markup is already rendered.
+
+Both paths pick a random question id per call and run on an open session,
+as after the question selection queries. The cache is measured warm
+(every question built once beforehand).
+
+    python -m benchmarks.bench_question_payload --questions 1000 --repeat 5000
+"""
+import argparse
+import json
+import random
+from flask import Response, jsonify, render_template
+from benchmarks._common import make_app, time_calls, summarize
+from benchmarks.bench_search import generate_questions
+from db.tables import db, Question
+from api.question_cache import get_payload
+
+
+def orm_question(question_id):
+    question = db.session.get(Question, question_id)
+    options = {'a': question.option_a, 'b': question.option_b, 'c': question.option_c, 'd': question.option_d}
+    response = jsonify({'id': question.id, 'prompt': question.prompt, 'options': options})
+    html = render_template('_quiz_options.html', options=options)
+    db.session.expunge_all()
+    return response.get_data(), html
+
+
+def cached_question(question_id):
+    payload = get_payload(question_id)
+    response = Response(payload.json, mimetype='application/json')
+    return response.get_data(), payload.options_html
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5000)
+    parser.add_argument('--db', help='Database URI (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        generate_questions(args.questions)
+        question_ids = [question_id for (question_id,) in db.session.query(Question.id)]
+        rng = random.Random(1)
+
+        for question_id in question_ids:
+            json_body, html = orm_question(question_id)
+            payload = get_payload(question_id)
+            assert payload.json == json_body and str(payload.options_html) == html.strip()
+
+        with app.test_request_context():
+            orm = time_calls(lambda: orm_question(rng.choice(question_ids)), args.repeat)
+            cached = time_calls(lambda: cached_question(rng.choice(question_ids)), args.repeat)
+
+    report = {
+        'questions': args.questions,
+        'orm': summarize(orm),
+        'cached': summarize(cached),
+        'speedup_p50': round(summarize(orm)['p50_ms'] / max(summarize(cached)['p50_ms'], 1e-6), 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
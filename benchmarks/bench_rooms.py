@@ -0,0 +1,270 @@
+"""
+Load test for live quiz rooms: --players simulated players in one room.
+
+Starts the app in a server subprocess (uvicorn on asgi.py, or Werkzeug's
+threaded WSGI server with --server wsgi) on a fresh SQLite database. Then,
+from one asyncio client process:
+
+  1. every player joins the room and opens its SSE event stream;
+  2. the host runs --rounds rounds; each player answers after a random
+     think time of up to --think-ms, about 70% of them correctly;
+  3. the host closes the room, and the database is checked: one score row
+     per answer, and users.total_score consistent with the history.
+
+Reports join and answer latency, how long round_started and round_ended
+took to reach every listener (from when the host's request and the last
+answer were sent), and the server's peak thread count, as JSON.
+
+    python -m benchmarks.bench_rooms --players 500 --rounds 3
+    python -m benchmarks.bench_rooms --players 500 --server wsgi
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from sqlalchemy import insert
+from benchmarks._common import summarize
+
+SECRET_KEY = 'benchmark'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(db_uri, players, questions):
+    """Users 1..players+1 (the last one hosts) and a small question bank; returns (app, correct options)"""
+    from app import create_app
+    from db.init_db import ensure_db
+    from db.tables import db, User, Question
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': db_uri, 'SECRET_KEY': SECRET_KEY})
+    ensure_db(app)
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'username': f'user{i}', 'nickname': f'player{i}', 'password_hash': '-', 'total_score': 0}
+            for i in range(1, players + 2)
+        ])
+        db.session.execute(insert(Question), [
+            {'prompt': f'Room question {i}?', 'option_a': 'A', 'option_b': 'B', 'option_c': 'C',
+             'option_d': 'D', 'correct_option': 'abcd'[i % 4]}
+            for i in range(1, questions + 1)
+        ])
+        db.session.commit()
+        correct = dict(db.session.query(Question.id, Question.correct_option))
+    return app, correct
+
+
+def start_server(mode, port, env):
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                   '--port', str(port), '--log-level', 'warning', '--backlog', '4096',
+                   # players' answer connections sit idle between rounds
+                   '--timeout-keep-alive', '120']
+    else:
+        command = [sys.executable, '-c',
+                   'import sys; from werkzeug.serving import run_simple; from app import create_app; '
+                   'run_simple("127.0.0.1", int(sys.argv[1]), create_app(), threaded=True)', str(port)]
+    # A file, not a pipe: Werkzeug logs every request and would block on a full pipe
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                log.seek(0)
+                raise SystemExit(log.read().decode())
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit('server did not start')
+
+
+def thread_count(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('Threads:'))
+    except (OSError, StopIteration):
+        return None
+
+
+class Listener:
+    """One player's SSE stream; records when each event arrived"""
+
+    def __init__(self):
+        self.events = []            # (received at, name, data)
+        self.connected = asyncio.Event()
+        self.new_event = asyncio.Condition()
+
+    async def run(self, client, url):
+        async with client.stream('GET', url, timeout=None) as response:
+            response.raise_for_status()
+            self.connected.set()
+            name = data = None
+            async for line in response.aiter_lines():
+                if line.startswith('event: '):
+                    name = line[7:]
+                elif line.startswith('data: '):
+                    data = json.loads(line[6:])
+                elif not line and name:
+                    async with self.new_event:
+                        self.events.append((time.perf_counter(), name, data))
+                        self.new_event.notify_all()
+                    if name == 'room_closed':
+                        return
+                    name = data = None
+
+    async def wait_for(self, name, round_number):
+        async with self.new_event:
+            while True:
+                for received, event_name, data in self.events:
+                    if event_name == name and data.get('round') == round_number:
+                        return received, data
+                await self.new_event.wait()
+
+
+async def run_room(args, base_url, cookies, correct_options):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.players * 2 + 50, max_keepalive_connections=args.players * 2)
+    clients = [httpx.AsyncClient(base_url=base_url, cookies={'session': cookie}, limits=limits, timeout=60)
+               for cookie in cookies]
+    host, players = clients[-1], clients[:-1]
+    result = {'join': [], 'answer': [], 'round_started_fanout': [], 'round_ended_fanout': [], 'errors': 0}
+    try:
+        response = await host.post('/api/rooms', json={'round_seconds': args.round_seconds})
+        code = response.json()['code']
+
+        async def join(client):
+            start = time.perf_counter()
+            response = await client.post(f'/api/rooms/{code}/join')
+            result['join'].append((time.perf_counter() - start) * 1000)
+            result['errors'] += response.status_code != 200
+
+        await asyncio.gather(*(join(client) for client in players))
+
+        listeners = [Listener() for _ in players]
+        streams = [asyncio.ensure_future(listener.run(client, f'/api/rooms/{code}/events'))
+                   for listener, client in zip(listeners, players)]
+        await asyncio.wait_for(asyncio.gather(*(listener.connected.wait() for listener in listeners)), 60)
+
+        rng = random.Random(7)
+        for round_number in range(1, args.rounds + 1):
+            sent_at = []
+
+            async def play(client, listener):
+                _, data = await listener.wait_for('round_started', round_number)
+                await asyncio.sleep(rng.uniform(0, args.think_ms / 1000))
+                right = correct_options[data['question']['id']]
+                choice = right if rng.random() < 0.7 else rng.choice([o for o in 'abcd' if o != right])
+                start = time.perf_counter()
+                sent_at.append(start)
+                response = await client.post(f'/api/rooms/{code}/answer', json={'answer': choice})
+                result['answer'].append((time.perf_counter() - start) * 1000)
+                result['errors'] += response.status_code != 200
+
+            playing = [asyncio.ensure_future(play(client, listener)) for client, listener in zip(players, listeners)]
+            started = time.perf_counter()
+            response = await host.post(f'/api/rooms/{code}/rounds', json={})
+            result['errors'] += response.status_code != 201
+            await asyncio.gather(*playing)
+            for listener in listeners:
+                received, _ = await listener.wait_for('round_started', round_number)
+                result['round_started_fanout'].append((received - started) * 1000)
+            last_answer = max(sent_at)
+            for listener in listeners:
+                received, _ = await asyncio.wait_for(listener.wait_for('round_ended', round_number), 60)
+                result['round_ended_fanout'].append((received - last_answer) * 1000)
+
+        response = await host.post(f'/api/rooms/{code}/close')
+        result['errors'] += response.status_code != 200
+        await asyncio.wait_for(asyncio.gather(*streams), 30)
+    finally:
+        for client in clients:
+            await client.aclose()
+    return result
+
+
+async def sample_threads(pid, peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], thread_count(pid) or 0)
+        await asyncio.sleep(0.1)
+
+
+async def run_with_sampling(args, base_url, cookies, correct_options, pid):
+    peak, stop = [0], asyncio.Event()
+    sampler = asyncio.ensure_future(sample_threads(pid, peak, stop))
+    try:
+        return await run_room(args, base_url, cookies, correct_options), peak[0]
+    finally:
+        stop.set()
+        await sampler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--round-seconds', type=int, default=30)
+    parser.add_argument('--think-ms', type=float, default=3000, help='Longest time a player takes to answer')
+    parser.add_argument('--server', choices=['asgi', 'wsgi'], default='asgi')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(prefix='quiz_rooms_', suffix='.db')
+    os.close(fd)
+    os.remove(db_path)
+    db_uri = f'sqlite:///{db_path}'
+    app, correct_options = prepare_database(db_uri, args.players, 50)
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookies = [serializer.dumps({'user_id': user_id}) for user_id in range(1, args.players + 2)]
+
+    port = free_port()
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=db_uri, SECRET_KEY=SECRET_KEY, METRICS_ENABLED='off')
+    server = start_server(args.server, port, env)
+    try:
+        start = time.perf_counter()
+        result, peak_threads = asyncio.run(
+            run_with_sampling(args, f'http://127.0.0.1:{port}', cookies, correct_options, server.pid))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    from api.reconcile_service import find_score_discrepancies
+    from db.tables import db, Score
+    with app.app_context():
+        score_rows = db.session.query(Score).count()
+        discrepancies = len(find_score_discrepancies())
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(json.dumps({
+        'config': vars(args),
+        'join': summarize(sorted(result['join'])),
+        'answer': summarize(sorted(result['answer'])),
+        'round_started_fanout': dict(summarize(sorted(result['round_started_fanout'])),
+                                     max_ms=round(max(result['round_started_fanout']), 3)),
+        'round_ended_fanout': dict(summarize(sorted(result['round_ended_fanout'])),
+                                   max_ms=round(max(result['round_ended_fanout']), 3)),
+        'errors': result['errors'],
+        'score_rows': score_rows,
+        'expected_score_rows': args.players * args.rounds,
+        'total_score_discrepancies': discrepancies,
+        'server_peak_threads': peak_threads,
+        'elapsed_s': round(elapsed, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark question search on a synthetic question bank.
+
+Compares the FTS5 index against the LIKE '%...%' scan it replaces.
+
+    python -m benchmarks.bench_search --questions 100000
+"""
+import argparse
+import json
+import random
+import time
+from sqlalchemy import insert
+from benchmarks._common import make_app, time_calls, summarize
+from db.tables import db, Question
+from db.search_index import rebuild_search_index
+from api.search_service import search_questions, _search_like, _TOKEN_RE
+
+VOCABULARY = (
+    'python function variable loop list tuple dictionary class object method '
+    'module package import exception generator decorator iterator lambda '
+    'neural network gradient tokenization embedding transformer attention '
+    'convolution pooling classifier regression dataset training inference '
+    'deployment latency model accuracy precision recall vision image pixel '
+    'language sentence grammar corpus vector matrix tensor kernel batch'
+).split()
+
+QUERIES = ['tokenization', 'neural network', 'gradient descent', 'python decorator',
+           'image', 'transformer attention', 'dictionary', 'emb', 'term1234']
+
+
+# Long tail of rare terms so common words are not in every row
+RARE_TERMS = [f'term{i}' for i in range(20000)]
+
+
+def _word(rng):
+    return rng.choice(VOCABULARY) if rng.random() < 0.2 else rng.choice(RARE_TERMS)
+
+
+def _sentence(rng, words):
+    return ' '.join(_word(rng) for _ in range(words)).capitalize()
+
+
+def generate_questions(count, seed=42, batch_size=10000):
+    """Bulk-insert `count` synthetic questions"""
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        rows = [
+            {
+                'prompt': _sentence(rng, 12) + '?',
+                'option_a': _sentence(rng, 4),
+                'option_b': _sentence(rng, 4),
+                'option_c': _sentence(rng, 4),
+                'option_d': _sentence(rng, 4),
+                'correct_option': rng.choice('abcd'),
+            }
+            for _ in range(min(batch_size, count - start))
+        ]
+        db.session.execute(insert(Question), rows)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', help='Database URI (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        start = time.perf_counter()
+        generate_questions(args.questions)
+        generated = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rebuild_search_index()
+        indexed = time.perf_counter() - start
+
+        report = {
+            'questions': args.questions,
+            'generate_s': round(generated, 2),
+            'index_build_s': round(indexed, 2),
+            'queries': {}
+        }
+        for query in QUERIES:
+            tokens = _TOKEN_RE.findall(query.lower())
+            report['queries'][query] = {
+                'fts': summarize(time_calls(lambda: search_questions(query, 1, 20), args.repeat)),
+                'like': summarize(time_calls(lambda: _search_like(tokens, 1, 20), max(1, args.repeat // 4))),
+                'matches': search_questions(query, 1, 1)['total'],
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
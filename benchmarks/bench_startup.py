@@ -0,0 +1,100 @@
+"""
+Startup benchmark and regression guard.
+
+Each run happens in a fresh interpreter. It measures the time to
+`import app`, to run create_app(), and to serve the first request
+(which includes database initialization) against a temporary SQLite file.
+
+The script exits with status 1 when `import app` pulls in heavy modules
+(these should load only inside create_app()), or when the median timings
+exceed the given budgets.
+
+    python -m benchmarks.bench_startup --runs 5 --max-import-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Must not be imported by a bare `import app`
+HEAVY_MODULES = ['sqlalchemy', 'flask_sqlalchemy', 'flask_limiter', 'requests', 'bleach', 'numpy', 'api', 'db']
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+heavy = [name for name in HEAVY if name in sys.modules]
+application = app.create_app()
+created = time.perf_counter()
+client = application.test_client()
+status = client.get('/leaderboard').status_code
+first = time.perf_counter()
+client.get('/leaderboard')
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'warm_request_ms': (second - first) * 1000,
+    'heavy_on_import': heavy,
+    'status': status,
+}))
+'''
+
+
+def run_once(project_root):
+    fd, db_path = tempfile.mkstemp(prefix='quiz_startup_', suffix='.db')
+    os.close(fd)
+    os.remove(db_path)
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f'sqlite:///{db_path}', SECRET_KEY='benchmark')
+    try:
+        output = subprocess.run(
+            [sys.executable, '-c', f'HEAVY = {HEAVY_MODULES!r}\n{PROBE}'],
+            cwd=project_root, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, default=400)
+    parser.add_argument('--max-first-request-ms', type=float, default=3000)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [run_once(project_root) for _ in range(args.runs)]
+
+    report = {
+        metric: round(statistics.median(run[metric] for run in runs), 1)
+        for metric in ('import_ms', 'create_app_ms', 'first_request_ms', 'warm_request_ms')
+    }
+    report['heavy_on_import'] = sorted({name for run in runs for name in run['heavy_on_import']})
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report['heavy_on_import']:
+        failures.append(f"`import app` loads {', '.join(report['heavy_on_import'])}")
+    if report['import_ms'] > args.max_import_ms:
+        failures.append(f"import took {report['import_ms']}ms (budget {args.max_import_ms}ms)")
+    if report['create_app_ms'] + report['first_request_ms'] > args.max_first_request_ms:
+        failures.append(f"time to first request {report['create_app_ms'] + report['first_request_ms']}ms "
+                        f"(budget {args.max_first_request_ms}ms)")
+    if any(run['status'] != 200 for run in runs):
+        failures.append('first request did not return 200')
+
+    if failures:
+        for failure in failures:
+            print(f'REGRESSION: {failure}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Query-plan regression check for the service layer (SQLite).
+
+Calls every service function in api/*_service.py against a scratch
+database. It captures each SQL statement the function issues and runs
+EXPLAIN QUERY PLAN on it; an executemany is checked with its first
+parameter set. The check fails when a statement walks a whole table: a
+bare "SCAN <table>", or a scan of one of its indexes (covering or not),
+unless the index yields the rows in ORDER BY order and a LIMIT stops the
+walk. Deliberate full scans are listed in ALLOWED_SCANS with the reason
+they are acceptable.
+
+    python -m benchmarks.check_query_plans      # exit status 1 on regression
+
+The same check runs under pytest (tests/test_query_plans.py).
+"""
+import re
+import sys
+from datetime import datetime, timedelta
+from flask import session
+from sqlalchemy import event, insert
+from benchmarks._common import make_app
+from db.tables import db, User, Question, Score
+
+# (service call, table) -> why scanning the whole table is intended
+ALLOWED_SCANS = {
+    ('quiz_service.get_random_question', 'questions'):
+        'uniform random pick loads the unanswered part of the bank',
+    ('quiz_service.get_next_question[adaptive]', 'questions'):
+        'rating engine warm-up reads every question id once per process',
+    ('quiz_service.get_next_question[adaptive]', 'scores'):
+        'rating engine warm-up replays every attempt once per process',
+    ('quiz_service.get_next_question[adaptive]', 'score_summaries'):
+        'rating engine warm-up replays compacted history once per process',
+    ('quiz_service.get_next_question[adaptive]', 'question_stats'):
+        'rating engine warm-up seeds ratings from every item statistic',
+    ('export_service.export_scores', 'scores'):
+        'bulk export streams the whole table by design',
+    ('leaderboard_service.get_leaderboard', 'users'):
+        'pagination needs the user count; SQLite walks the smallest users index',
+    ('reconcile_service.find_score_discrepancies', 'users'):
+        'consistency check compares every user against their whole history',
+    ('reconcile_service.find_score_discrepancies', 'scores'):
+        'consistency check compares every user against their whole history',
+    ('reconcile_service.find_score_discrepancies', 'score_summaries'):
+        'consistency check compares every user against their whole history',
+    ('reconcile_service.reconcile_total_scores', 'users'):
+        'consistency check compares every user against their whole history',
+    ('reconcile_service.reconcile_total_scores', 'scores'):
+        'consistency check compares every user against their whole history',
+    ('reconcile_service.reconcile_total_scores', 'score_summaries'):
+        'consistency check compares every user against their whole history',
+    ('analytics_service.run_item_analysis[full]', 'question_stats'):
+        'full recompute deletes every stored statistic',
+    ('analytics_service.run_item_analysis[full]', 'score_summaries'):
+        'full recompute folds in every compacted attempt',
+}
+
+_SCAN_RE = re.compile(r'^SCAN (\w+)(.*)$')
+
+
+def seed_scratch_data():
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'nickname': f'player{i}', 'password_hash': '-', 'total_score': i * 10}
+        for i in range(1, 201)
+    ])
+    db.session.execute(insert(Question), [
+        {'prompt': f'What is tokenization number {i}?', 'option_a': 'a', 'option_b': 'b',
+         'option_c': 'c', 'option_d': 'd', 'correct_option': 'a'}
+        for i in range(1, 101)
+    ])
+    start = datetime.utcnow() - timedelta(days=400)
+    db.session.execute(insert(Score), [
+        {'user_id': 1 + i % 200, 'question_id': 1 + i % 100, 'correct': i % 3 == 0,
+         'answer': 'abcd'[i % 4], 'points': 10 if i % 3 == 0 else 0,
+         'timestamp': start + timedelta(hours=i)}
+        for i in range(5000)
+    ])
+    db.session.commit()
+    from db.search_index import rebuild_search_index
+    rebuild_search_index()
+
+
+def service_calls():
+    """(name, callable) for every service entry point worth checking"""
+    from api import auth_service, profile_service, quiz_service, leaderboard_service
+    from api import search_service, export_service, analytics_service, retention_service, room_service
+    from api import reconcile_service
+    from api.adaptive_service import rating_engine
+
+    def login_as_user_1():
+        session['user_id'] = 1
+        session['csrf_token'] = 'token'
+
+    return [
+        ('auth_service.authenticate_user', lambda: auth_service.authenticate_user('user1', 'wrong')),
+        ('auth_service.register_user',
+         lambda: auth_service.register_user('newuser', 'newplayer', 'password1', 'password1')),
+        ('profile_service.get_user_profile[user]', lambda: profile_service.get_user_profile(user_id=1)),
+        ('profile_service.get_user_profile[nickname]', lambda: profile_service.get_user_profile(nickname='player2')),
+        ('profile_service.get_activity', lambda: profile_service.get_activity(1, limit=20)),
+        ('profile_service.get_activity[cursor]',
+         lambda: profile_service.get_activity(1, cursor=profile_service.get_activity(1, limit=5)[2]['next_cursor'])),
+        ('profile_service.update_user_profile',
+         lambda: (login_as_user_1(), profile_service.update_user_profile(1, 'player1b', 'token'))),
+        ('quiz_service.get_question_by_id', lambda: quiz_service.get_question_by_id(5)),
+        ('quiz_service.get_random_question', lambda: quiz_service.get_random_question(1)),
+        ('quiz_service.get_next_question[adaptive]', lambda: quiz_service.get_next_question(1, 'adaptive')),
+        ('quiz_service.submit_answer', lambda: quiz_service.submit_answer(1, 7, 'a')),
+        ('adaptive_service.RatingEngine.refresh',
+         lambda: (quiz_service.submit_answer(2, 11, 'b'), rating_engine.refresh())),
+        ('leaderboard_service.get_leaderboard', lambda: leaderboard_service.get_leaderboard(2, 50)),
+        ('leaderboard_service.get_user_rank', lambda: leaderboard_service.get_user_rank(3)),
+        ('search_service.search_questions', lambda: search_service.search_questions('tokenization', 1, 20)),
+        ('export_service.export_scores',
+         lambda: list(export_service.export_scores('csv', since=datetime.utcnow() - timedelta(days=30)))),
+        ('analytics_service.run_item_analysis', lambda: analytics_service.run_item_analysis()),
+        ('analytics_service.run_item_analysis[full]', lambda: analytics_service.run_item_analysis(full=True)),
+        ('retention_service.compact_scores',
+         lambda: retention_service.compact_scores(older_than_days=200, batch_size=500, max_batches=2)),
+        ('retention_service.attempt_totals', lambda: retention_service.attempt_totals(1)),
+        ('retention_service.has_correct_answer', lambda: retention_service.has_correct_answer(1, 8)),
+        ('reconcile_service.find_score_discrepancies', lambda: reconcile_service.find_score_discrepancies()),
+        ('reconcile_service.reconcile_total_scores',
+         lambda: (User.query.filter(User.id <= 20).update({'total_score': User.total_score + 5}),
+                  reconcile_service.reconcile_total_scores(apply=True))),
+        ('room_service.persist_answers',
+         lambda: room_service.persist_answers([
+             {'user_id': i, 'question_id': 9, 'correct': i % 2 == 0, 'answer': 'a', 'points': 10 * (i % 2 == 0),
+              'timestamp': datetime.utcnow()}
+             for i in range(1, 51)
+         ])),
+    ]
+
+
+def capture_statements(func):
+    """Run func and return the (statement, parameters) it sent to the database"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            # Every parameter set of an executemany gets the same plan. A batched
+            # "insertmanyvalues" INSERT arrives flagged executemany with one flat set
+            if executemany and parameters and isinstance(parameters[0], (tuple, list, dict)):
+                parameters = parameters[0]
+            captured.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def full_scans(statement, plan):
+    """Tables the plan walks end to end"""
+    # An index walk is bounded only if it yields rows in ORDER BY order, so LIMIT stops it early
+    ordered_by_index = (
+        re.search(r'\bORDER BY\b', statement, re.IGNORECASE) is not None
+        and re.search(r'\bLIMIT\b', statement, re.IGNORECASE) is not None
+        and not any('TEMP B-TREE FOR ORDER BY' in detail for detail in plan)
+    )
+    tables = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if not match:
+            continue
+        table, rest = match.groups()
+        if table not in db.metadata.tables:
+            continue  # subquery results, constant rows
+        if 'VIRTUAL TABLE' in rest:
+            continue
+        if 'USING' in rest and ordered_by_index:
+            continue
+        tables.append(table)
+    return tables
+
+
+def find_regressions():
+    """Run every service call and return the (call, table) full scans not in ALLOWED_SCANS"""
+    app = make_app()
+    failures = []
+    with app.test_request_context():
+        seed_scratch_data()
+        for name, func in service_calls():
+            statements = capture_statements(func)
+            db.session.rollback()
+            for statement, parameters in statements:
+                plan = [row[3] for row in db.session.connection().exec_driver_sql(
+                    f'EXPLAIN QUERY PLAN {statement}', parameters
+                )]
+                for table in full_scans(statement, plan):
+                    reason = ALLOWED_SCANS.get((name, table))
+                    status = f'allowed ({reason})' if reason else 'FULL SCAN'
+                    print(f'{status:>10}  {name}: {table}\n            {" ".join(statement.split())[:160]}')
+                    if not reason:
+                        failures.append((name, table))
+            print(f'{"checked":>10}  {name} ({len(statements)} statements)')
+            db.session.rollback()
+    return failures
+
+
+def main():
+    failures = find_regressions()
+    if failures:
+        print(f'\n{len(failures)} query plan regression(s):')
+        for name, table in failures:
+            print(f'  {name} scans {table}')
+        sys.exit(1)
+    print('\nNo unexpected full table scans.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+CSRF tokens, masked per response.
+
+Each session holds one random token. Pages never contain it as-is: every
+render gets it XORed with a fresh random pad, sent as base64(pad + masked).
+HTML is gzipped (see assets.py), and a compressed page that also reflects
+user input would otherwise let an attacker recover a fixed token from the
+response sizes (BREACH). token_matches() accepts a masked token or the raw
+one.
+"""
+import base64
+import secrets
+from flask import session
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def masked_token():
+    """The session's token under a fresh random mask, for embedding in a page"""
+    token = session.get('csrf_token')
+    if not token:
+        return None
+    raw = token.encode('ascii')
+    pad = secrets.token_bytes(len(raw))
+    return base64.urlsafe_b64encode(pad + bytes(a ^ b for a, b in zip(pad, raw))).decode('ascii')
+
+
+def _unmask(provided):
+    try:
+        data = base64.urlsafe_b64decode(provided.encode('ascii'))
+    except (ValueError, UnicodeEncodeError):
+        return None
+    half = len(data) // 2
+    if not half or len(data) != 2 * half:
+        return None
+    return bytes(a ^ b for a, b in zip(data[:half], data[half:]))
+
+
+def token_matches(provided):
+    """Whether a submitted token (masked or raw) is the session's token"""
+    expected = session.get('csrf_token')
+    if not provided or not expected:
+        return False
+    expected = expected.encode('ascii')
+    unmasked = _unmask(provided)
+    if unmasked is not None and secrets.compare_digest(unmasked, expected):
+        return True
+    return secrets.compare_digest(provided.encode('utf-8'), expected)
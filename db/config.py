@@ -0,0 +1,142 @@
+"""
+Database engine configuration: SQLite pragmas, connection pool sizing and
+routing of read-only queries to a separate engine (replica).
+
+Settings come from the environment:
+
+    SQLITE_PRAGMAS=on|off       apply the SQLite tuning below (default on)
+    SQLITE_JOURNAL_MODE         default WAL: readers no longer block on writers
+    SQLITE_SYNCHRONOUS          default NORMAL (safe with WAL, far fewer fsyncs)
+    SQLITE_BUSY_TIMEOUT_MS      default 5000: wait for locks instead of failing
+    SQLITE_CACHE_SIZE_KB        default 20000 page cache per connection
+    DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_RECYCLE / DB_POOL_TIMEOUT
+    SQLALCHEMY_READ_DATABASE_URI  optional read replica for read-only services
+"""
+import os
+from contextlib import contextmanager
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from db.init_db import db
+
+READ_BIND = 'read'
+
+
+def _is_sqlite(uri):
+    return (uri or '').startswith('sqlite')
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _load_settings(app):
+    """Copy database tuning settings from the environment into app.config (without overriding)"""
+    app.config.setdefault('SQLITE_PRAGMAS', os.getenv('SQLITE_PRAGMAS', 'on').lower() not in ('0', 'off', 'false'))
+    app.config.setdefault('SQLITE_JOURNAL_MODE', os.getenv('SQLITE_JOURNAL_MODE', 'WAL'))
+    app.config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', _int_env('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config.setdefault('SQLITE_CACHE_SIZE_KB', _int_env('SQLITE_CACHE_SIZE_KB', 20000))
+    app.config.setdefault('DB_POOL_SIZE', _int_env('DB_POOL_SIZE', 10))
+    app.config.setdefault('DB_MAX_OVERFLOW', _int_env('DB_MAX_OVERFLOW', 20))
+    app.config.setdefault('DB_POOL_RECYCLE', _int_env('DB_POOL_RECYCLE', 1800))
+    app.config.setdefault('DB_POOL_TIMEOUT', _int_env('DB_POOL_TIMEOUT', 30))
+    if os.getenv('SQLALCHEMY_READ_DATABASE_URI'):
+        app.config.setdefault('SQLALCHEMY_READ_DATABASE_URI', os.getenv('SQLALCHEMY_READ_DATABASE_URI'))
+
+
+def _engine_options(app, uri):
+    options = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+    }
+    if _is_sqlite(uri):
+        if ':memory:' in uri or uri.rstrip('/') == 'sqlite:':
+            return {}
+        # Python's sqlite3 waits this long on a locked database before raising
+        options['connect_args'] = {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+    else:
+        options['pool_recycle'] = app.config['DB_POOL_RECYCLE']
+        options['pool_pre_ping'] = True
+    return options
+
+
+def _sqlite_pragmas(app, read_only=False):
+    pragmas = [
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return apply
+
+
+def configure_database(app):
+    """
+    Initialize Flask-SQLAlchemy for the app with tuned engine options.
+    Use instead of db.init_app(app).
+    """
+    _load_settings(app)
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', _engine_options(app, uri))
+
+    read_uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+    if read_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(READ_BIND, {'url': read_uri, **_engine_options(app, read_uri)})
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    if app.config['SQLITE_PRAGMAS']:
+        with app.app_context():
+            for bind, engine in db.engines.items():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', _sqlite_pragmas(app, read_only=bind == READ_BIND))
+
+    app.teardown_appcontext(_close_read_session)
+
+
+def get_read_session():
+    """
+    Session for read-only queries (leaderboard, ranks, public profiles).
+    Bound to the read replica when one is configured, otherwise the regular
+    session. Replica reads may lag slightly behind writes.
+    """
+    if READ_BIND not in db.engines or g.get('_read_from_primary'):
+        return db.session
+    session = g.get('_read_session')
+    if session is None:
+        session = g._read_session = Session(bind=db.engines[READ_BIND])
+    return session
+
+
+@contextmanager
+def reads_from_primary():
+    """Route get_read_session() to the primary inside the block, e.g. to read a write that just happened"""
+    previous = g.get('_read_from_primary', False)
+    g._read_from_primary = True
+    try:
+        yield
+    finally:
+        g._read_from_primary = previous
+
+
+def _close_read_session(exception=None):
+    session = g.pop('_read_session', None)
+    if session is not None:
+        session.close()
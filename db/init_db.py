@@ -1,11 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 import os
+import threading
 
 db = SQLAlchemy()
 
+_init_lock = threading.Lock()
+
 
 def init_db(app):
-    """Initialize database tables"""
+    """Initialize database tables and apply pending schema migrations"""
+    from db.search_index import create_search_index
+    from db.migrations import migrate
+
     with app.app_context():
         db_path = app.config.get('SQLALCHEMY_DATABASE_URI', '').replace('sqlite:///', '')
         if db_path and not os.path.exists(db_path):
@@ -13,5 +19,16 @@ def init_db(app):
             print(f"Database created: {db_path}")
         else:
             db.create_all()
+        for version, description in migrate():
+            print(f"Applied migration {version}: {description}")
+        create_search_index()
 
 
+def ensure_db(app):
+    """Run init_db() once per application, on first use"""
+    if app.extensions.get('quiz_db_ready'):
+        return
+    with _init_lock:
+        if not app.extensions.get('quiz_db_ready'):
+            init_db(app)
+            app.extensions['quiz_db_ready'] = True
@@ -0,0 +1,143 @@
+"""
+Versioned schema migrations for existing databases.
+
+create_all() only creates missing tables; it never adds columns or
+indexes to tables that already exist. Each migration below runs once per
+database, in version order, and is recorded in the schema_migrations
+table. Migrations must be idempotent, because on a fresh database
+create_all() has usually built their objects already.
+
+To change the schema, update the model in db/tables.py and append a new
+migration with the next version number.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from db.init_db import db
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function taking a SQLAlchemy connection"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def _add_column_if_missing(conn, table, column, ddl):
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+@migration(1, 'Record the chosen option on each score')
+def _add_score_answer(conn):
+    _add_column_if_missing(conn, 'scores', 'answer', 'VARCHAR(1)')
+
+
+@migration(2, 'Index users.total_score for leaderboard ordering and rank counts')
+def _index_total_score(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_total_score ON users (total_score)'))
+
+
+@migration(3, 'Index scores (user_id, question_id, correct) for answer submission lookups')
+def _index_score_lookup(conn):
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_scores_user_question_correct '
+        'ON scores (user_id, question_id, correct)'
+    ))
+
+
+@migration(4, 'Index scores (user_id, timestamp, id) for activity history paging')
+def _index_score_history(conn):
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_scores_user_timestamp '
+        'ON scores (user_id, timestamp, id)'
+    ))
+
+
+@migration(5, 'Add the fragment_invalidations log shared by web workers')
+def _add_fragment_invalidations(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS fragment_invalidations ('
+        'id INTEGER PRIMARY KEY, '
+        'events TEXT NOT NULL, '
+        'created_at DATETIME NOT NULL)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_fragment_invalidations_created_at '
+        'ON fragment_invalidations (created_at)'
+    ))
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(255) NOT NULL, '
+        'applied_at DATETIME NOT NULL)'
+    ))
+
+
+def applied_versions():
+    """Versions already applied to the current database"""
+    with db.engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+
+@contextmanager
+def _locked_transaction():
+    """
+    A transaction holding the database write lock from its first statement
+    (SQLite: BEGIN IMMEDIATE), so workers migrating at the same time take
+    turns; the DDL runs inside it too
+    """
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def migrate():
+    """
+    Apply pending migrations, each in its own transaction. Safe to run
+    from several workers at once: each version is re-checked under the
+    write lock, and one recorded meanwhile counts as applied.
+    Returns: list of (version, description) applied
+    """
+    applied = applied_versions()
+    done = []
+    for version, description, func in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with _locked_transaction() as conn:
+                if conn.execute(text('SELECT 1 FROM schema_migrations WHERE version = :version'),
+                                {'version': version}).first():
+                    continue
+                func(conn)
+                conn.execute(
+                    text('INSERT INTO schema_migrations (version, description, applied_at) '
+                         'VALUES (:version, :description, :applied_at)'),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Databases without an up-front write lock: another worker recorded it first
+            continue
+        done.append((version, description))
+    return done
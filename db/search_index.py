@@ -0,0 +1,44 @@
+"""Full-text search index over question prompts and options"""
+from sqlalchemy import text
+from db.init_db import db
+
+SEARCH_TABLE = 'questions_fts'
+
+_fts_support = {}
+
+
+def search_index_supported():
+    """FTS5 is only available on SQLite builds that ship the extension"""
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _fts_support:
+        supported = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                options = [row[0] for row in conn.execute(text('PRAGMA compile_options'))]
+            supported = 'ENABLE_FTS5' in options
+        _fts_support[key] = supported
+    return _fts_support[key]
+
+
+def create_search_index():
+    """Create the FTS5 table backed by the questions table (external content)"""
+    if not search_index_supported():
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "prompt, option_a, option_b, option_c, option_d, "
+            "content='questions', content_rowid='id', "
+            "tokenize='porter unicode61')"
+        ))
+    return True
+
+
+def rebuild_search_index():
+    """Re-read every question into the index; run after seeding or bulk edits"""
+    if not create_search_index():
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild')"))
+    return True
@@ -12,7 +12,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     nickname = db.Column(db.String(80), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    total_score = db.Column(db.Integer, default=0, nullable=False)
+    total_score = db.Column(db.Integer, default=0, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.now(), nullable=False)
     
     scores = db.relationship('Score', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -55,13 +55,84 @@ class Question(db.Model):
 class Score(db.Model):
     """Individual quiz attempt record"""
     __tablename__ = 'scores'
+    __table_args__ = (
+        db.Index('ix_scores_user_question_correct', 'user_id', 'question_id', 'correct'),
+        db.Index('ix_scores_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     correct = db.Column(db.Boolean, nullable=False)
+    answer = db.Column(db.String(1), nullable=True)
     points = db.Column(db.Integer, default=0, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     def __repr__(self):
         return f'<Score user_id={self.user_id} question_id={self.question_id} correct={self.correct}>'
+
+
+class ScoreSummary(db.Model):
+    """Compacted history: one row per (user, question) for attempts removed from scores"""
+    __tablename__ = 'score_summaries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    corrects = db.Column(db.Integer, default=0, nullable=False)
+    points = db.Column(db.Integer, default=0, nullable=False)
+    first_attempt_at = db.Column(db.DateTime, nullable=False)
+    first_attempt_correct = db.Column(db.Boolean, nullable=False)
+    first_correct_at = db.Column(db.DateTime, nullable=True)
+    last_attempt_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<ScoreSummary user_id={self.user_id} question_id={self.question_id} attempts={self.attempts}>'
+
+
+class QuestionStat(db.Model):
+    """Item-analysis statistics per question, accumulated from Score rows"""
+    __tablename__ = 'question_stats'
+    
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+    # Running sums over attempts of the player's ability (total score at analysis time),
+    # kept so point-biserial discrimination can be updated incrementally
+    sum_ability = db.Column(db.Float, default=0.0, nullable=False)
+    sum_ability_sq = db.Column(db.Float, default=0.0, nullable=False)
+    sum_correct_ability = db.Column(db.Float, default=0.0, nullable=False)
+    picks_a = db.Column(db.Integer, default=0, nullable=False)
+    picks_b = db.Column(db.Integer, default=0, nullable=False)
+    picks_c = db.Column(db.Integer, default=0, nullable=False)
+    picks_d = db.Column(db.Integer, default=0, nullable=False)
+    p_value = db.Column(db.Float, nullable=True)
+    discrimination = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<QuestionStat question_id={self.question_id} p={self.p_value} r={self.discrimination}>'
+
+
+class FragmentInvalidation(db.Model):
+    """Log of fragment cache invalidations, replayed by every worker (see api/fragment_cache.py)"""
+    __tablename__ = 'fragment_invalidations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    events = db.Column(db.Text, nullable=False)  # JSON list of [kind, *args]
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<FragmentInvalidation {self.id} {self.events}>'
+
+
+class JobState(db.Model):
+    """Progress markers for batch jobs (e.g. the last Score.id a job has processed)"""
+    __tablename__ = 'job_state'
+    
+    name = db.Column(db.String(80), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<JobState {self.name}={self.value}>'
@@ -0,0 +1,155 @@
+"""Maintenance commands: python manage.py <command> [options]"""
+import argparse
+import sys
+from datetime import datetime
+from app import create_app
+from db.init_db import ensure_db
+
+
+def export_scores_command(app, args):
+    """Stream the scores table to a file or stdout"""
+    from api.export_service import export_scores
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        with app.app_context():
+            for chunk in export_scores(args.format, since=args.since, until=args.until,
+                                       nickname=args.user, chunk_size=args.chunk_size):
+                output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+def item_analysis_command(app, args):
+    """Update per-question difficulty/discrimination statistics"""
+    from api.analytics_service import run_item_analysis, get_item_statistics
+
+    with app.app_context():
+        summary = run_item_analysis(full=args.full, chunk_size=args.chunk_size)
+        print(f"Processed {summary['processed']} attempts, "
+              f"updated {summary['questions_updated']} questions "
+              f"(high-water mark: score #{summary['high_water_mark']})")
+
+        if args.report:
+            print(f"{'question':>8} {'attempts':>8} {'p':>6} {'r_pb':>6}  option share a/b/c/d")
+            for stat in get_item_statistics():
+                shares = '/'.join('-' if v is None else f'{v:.2f}' for v in stat['option_frequency'].values())
+                p_value = '-' if stat['p_value'] is None else f"{stat['p_value']:.2f}"
+                discrimination = '-' if stat['discrimination'] is None else f"{stat['discrimination']:.2f}"
+                print(f"{stat['question_id']:>8} {stat['attempts']:>8} {p_value:>6} {discrimination:>6}  {shares}")
+
+
+def migrate_command(app, args):
+    """Apply (or list) pending schema migrations"""
+    from db.migrations import migrate, pending_migrations
+    from db.tables import db
+
+    with app.app_context():
+        if args.status:
+            pending = pending_migrations()
+            for version, description in pending:
+                print(f"pending {version}: {description}")
+            if not pending:
+                print("Database schema is up to date.")
+            return
+        db.create_all()
+        applied = migrate()
+        for version, description in applied:
+            print(f"Applied migration {version}: {description}")
+        if not applied:
+            print("Database schema is up to date.")
+
+
+def compact_scores_command(app, args):
+    """Fold old attempts into per-user-per-question summaries"""
+    from api.retention_service import compact_scores
+
+    with app.app_context():
+        summary = compact_scores(args.older_than_days, args.batch_size, args.max_batches)
+        if not summary['analysed_up_to']:
+            print("Nothing compacted: run 'manage.py item-analysis' first")
+            return
+        print(f"Compacted {summary['compacted']} attempts in {summary['batches']} batches "
+              f"({summary['summaries_touched']} summaries touched)")
+
+
+def check_scores_command(app, args):
+    """Compare stored total scores with answer history, optionally fixing them"""
+    from api.reconcile_service import reconcile_total_scores
+
+    with app.app_context():
+        summary = reconcile_total_scores(apply=args.fix, batch_size=args.batch_size)
+    discrepancies = summary['discrepancies']
+    for user_id, nickname, stored, expected in discrepancies[:args.limit]:
+        print(f"user {user_id} ({nickname}): stored {stored}, expected {expected} ({expected - stored:+d})")
+    if len(discrepancies) > args.limit:
+        print(f"... and {len(discrepancies) - args.limit} more")
+    print(f"{len(discrepancies)} users with a wrong total_score")
+    if args.fix:
+        print(f"Fixed {summary['fixed']}, skipped {summary['skipped']} (score changed during the check)")
+    if discrepancies and not args.fix:
+        sys.exit(1)
+
+
+def build_assets_command(app, args):
+    """Fingerprint and precompress static assets"""
+    from assets import build_assets
+
+    manifest = build_assets(app.static_folder)
+    for source, hashed in sorted(manifest.items()):
+        print(f"{source} -> {hashed}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Python Quiz maintenance commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export-scores', help='Export quiz attempts as CSV or NDJSON')
+    export.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    export.add_argument('--since', type=datetime.fromisoformat, help='ISO-8601 start (inclusive)')
+    export.add_argument('--until', type=datetime.fromisoformat, help='ISO-8601 end (exclusive)')
+    export.add_argument('--user', help='Only export attempts by this nickname')
+    export.add_argument('--chunk-size', type=int, default=1000)
+    export.add_argument('--output', '-o', help='Output file (default: stdout)')
+    export.set_defaults(handler=export_scores_command)
+
+    analysis = commands.add_parser('item-analysis', help='Update per-question item statistics')
+    analysis.add_argument('--full', action='store_true',
+                          help='Recompute from all attempts, compacted ones included (exact)')
+    analysis.add_argument('--report', action='store_true', help='Print the statistics table afterwards')
+    analysis.add_argument('--chunk-size', type=int, default=50000)
+    analysis.set_defaults(handler=item_analysis_command)
+
+    compaction = commands.add_parser('compact-scores', help='Compact old attempts into summaries')
+    compaction.add_argument('--older-than-days', type=int, default=90)
+    compaction.add_argument('--batch-size', type=int, default=5000)
+    compaction.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    compaction.set_defaults(handler=compact_scores_command)
+
+    scores = commands.add_parser('check-scores', help='Verify users.total_score against answer history')
+    scores.add_argument('--fix', action='store_true', help='Write the expected scores')
+    scores.add_argument('--batch-size', type=int, default=1000)
+    scores.add_argument('--limit', type=int, default=20, help='Discrepancies to list')
+    scores.set_defaults(handler=check_scores_command)
+
+    migrations = commands.add_parser('migrate', help='Apply pending schema migrations')
+    migrations.add_argument('--status', action='store_true', help='Only list pending migrations')
+    migrations.set_defaults(handler=migrate_command, needs_db=False)
+
+    assets = commands.add_parser('build-assets', help='Fingerprint and precompress static assets')
+    assets.set_defaults(handler=build_assets_command, needs_db=False)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    app = create_app()
+    if getattr(args, 'needs_db', True):
+        ensure_db(app)
+    args.handler(app, args)
+
+
+if __name__ == '__main__':
+    main()
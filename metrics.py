@@ -0,0 +1,225 @@
+"""
+Request, SQL and upstream instrumentation exposed at /metrics.
+
+Every request records its latency, the number of SQL statements it issued,
+and the time spent in them, all labelled by Flask endpoint. SQLAlchemy
+engine events time each statement. Statements slower than SLOW_QUERY_MS
+are printed with the endpoint that issued them. WeatherAPI calls are timed
+through observe_upstream().
+
+Observations only bump a few counters under a lock. The Prometheus text
+is built when /metrics is scraped, so nothing extra runs while nobody is
+scraping. Metrics are per worker process.
+
+Settings (environment):
+
+    METRICS_ENABLED=on|off   default on
+    METRICS_TOKEN            require "Authorization: Bearer <token>" on /metrics
+    SLOW_QUERY_MS            default 200
+"""
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import Response, abort, g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_bound(bound):
+    return str(int(bound)) if float(bound).is_integer() and bound >= 1 else repr(float(bound))
+
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name, self.description, self.label_names = name, description, labels
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, description, labels=()):
+        self.name, self.description, self.label_names = name, description, labels
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge']
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.description, self.label_names = name, description, labels
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.series = {}
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (None,), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound is None else _format_bound(bound)
+                bucket_labels = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+REQUESTS = Counter('quiz_http_requests_total', 'HTTP requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('quiz_http_request_duration_seconds', 'HTTP request latency by endpoint',
+                            ('endpoint',))
+REQUEST_QUERIES = Histogram('quiz_db_queries_per_request', 'SQL statements issued per request',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram('quiz_db_time_per_request_seconds', 'Time spent in SQL per request',
+                            ('endpoint',))
+SLOW_QUERIES = Counter('quiz_db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS', ('endpoint',))
+UPSTREAM_LATENCY = Histogram('quiz_upstream_request_duration_seconds', 'Calls to external APIs',
+                             ('service', 'operation', 'outcome'))
+ROOM_STREAMS = Gauge('quiz_room_event_streams', 'Open room event streams served by asgi.py')
+
+REGISTRY = (REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, SLOW_QUERIES, UPSTREAM_LATENCY,
+            ROOM_STREAMS)
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def observe_upstream(service, operation):
+    """Time a call to an external API; an exception marks it as an error"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, (service, operation, outcome))
+
+
+def _current_endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+def _instrument_engine(engine, slow_query_seconds):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('quiz_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['quiz_query_start'].pop()
+        if has_request_context() and 'metrics_start' in g:
+            g.metrics_queries += 1
+            g.metrics_db_time += elapsed
+        if elapsed >= slow_query_seconds:
+            endpoint = _current_endpoint()
+            SLOW_QUERIES.inc((endpoint,))
+            print(f"Slow query ({elapsed * 1000:.1f}ms, {endpoint}): {' '.join(statement.split())[:300]}")
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        starts = exception_context.connection.info.get('quiz_query_start') if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+
+def init_metrics(app):
+    """Instrument requests and database engines and serve /metrics"""
+    app.config.setdefault('METRICS_ENABLED', os.getenv('METRICS_ENABLED', 'on').lower() not in ('0', 'off', 'false'))
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    app.config.setdefault('SLOW_QUERY_MS', float(os.getenv('SLOW_QUERY_MS', '200')))
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    from db.init_db import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(engine, app.config['SLOW_QUERY_MS'] / 1000)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_time = 0.0
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_metrics(exception=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        status = g.get('metrics_status', 500)
+        REQUESTS.inc((endpoint, request.method, str(status)))
+        REQUEST_LATENCY.observe(time.perf_counter() - start, (endpoint,))
+        REQUEST_QUERIES.observe(g.metrics_queries, (endpoint,))
+        REQUEST_DB_TIME.observe(g.metrics_db_time, (endpoint,))
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        token = app.config['METRICS_TOKEN']
+        if token:
+            provided = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not secrets.compare_digest(provided.encode('utf-8'), token.encode('utf-8')):
+                abort(401)
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
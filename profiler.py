@@ -0,0 +1,172 @@
+"""
+Opt-in profiling of live requests.
+
+Off unless PROFILING_ENABLED is set; when off no hooks are installed. When
+on, a request is profiled if:
+
+  * it carries `X-Profile: 1` together with a valid `X-Admin-Token`, or
+  * its endpoint is listed in PROFILE_ENDPOINTS (or the list is empty)
+    and a random draw falls under PROFILE_RATE.
+
+The default "sample" mode polls the request thread's stack every
+PROFILE_INTERVAL_MS from a helper thread. It writes collapsed stacks
+("frame;frame;frame count" per line), which flamegraph.pl, speedscope or
+inferno can render. "cprofile" mode runs cProfile on the request thread
+instead and writes a .prof file for pstats or snakeviz. Profiles go to
+PROFILE_DIR (default instance/profiles/). Only the newest PROFILE_MAX_FILES
+are kept. Header-triggered responses name their file in X-Profile-File.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+# While any sampler runs, the interpreter switches threads at the sampling
+# interval (default 5ms) so the sampler actually gets to run mid-request
+_active_samplers = 0
+_default_switch_interval = sys.getswitchinterval()
+_sampler_lock = threading.Lock()
+
+
+class StackSampler:
+    """Counts the call stacks one thread is in, polled at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        global _active_samplers
+        with _sampler_lock:
+            _active_samplers += 1
+            sys.setswitchinterval(min(self.interval, _default_switch_interval))
+        self._thread.start()
+
+    def stop(self):
+        global _active_samplers
+        self._stop.set()
+        self._thread.join()
+        with _sampler_lock:
+            _active_samplers -= 1
+            if not _active_samplers:
+                sys.setswitchinterval(_default_switch_interval)
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(';', ':')
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+
+def _write_profile(directory, endpoint, elapsed_ms, extension, write):
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{endpoint or 'unmatched'}_{elapsed_ms:.0f}ms.{extension}"
+    write(os.path.join(directory, name))
+    return name
+
+
+def _prune(directory, keep):
+    """Ring buffer: delete all but the newest `keep` profiles (names start with a timestamp)"""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(('.collapsed', '.prof')))
+    for name in names[:-keep] if keep else names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def init_profiler(app):
+    """Install the profiling hooks when PROFILING_ENABLED is on"""
+    app.config.setdefault('PROFILING_ENABLED', os.getenv('PROFILING_ENABLED', 'off').lower() in ('1', 'on', 'true'))
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    app.config.setdefault('PROFILE_MODE', os.getenv('PROFILE_MODE', 'sample'))
+    app.config.setdefault('PROFILE_RATE', float(os.getenv('PROFILE_RATE', '0')))
+    app.config.setdefault('PROFILE_ENDPOINTS', [
+        name.strip() for name in os.getenv('PROFILE_ENDPOINTS', '').split(',') if name.strip()
+    ])
+    app.config.setdefault('PROFILE_INTERVAL_MS', float(os.getenv('PROFILE_INTERVAL_MS', '1')))
+    app.config.setdefault('PROFILE_DIR', os.getenv('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PROFILE_MAX_FILES', int(os.getenv('PROFILE_MAX_FILES', '50')))
+    if app.config['PROFILE_MODE'] not in PROFILE_MODES:
+        raise ValueError(f"PROFILE_MODE must be one of: {', '.join(PROFILE_MODES)}")
+
+    endpoints = frozenset(app.config['PROFILE_ENDPOINTS'])
+    rate = app.config['PROFILE_RATE']
+    lock = threading.Lock()
+
+    def wants_profile():
+        if request.headers.get('X-Profile') == '1':
+            from api.services import is_admin_request
+            if is_admin_request(request):
+                g.profile_requested = True
+                return True
+        if endpoints and request.endpoint not in endpoints:
+            return False
+        return rate > 0 and random.random() < rate
+
+    @app.before_request
+    def start_profile():
+        if not wants_profile():
+            return
+        g.profile_start = time.perf_counter()
+        if app.config['PROFILE_MODE'] == 'cprofile':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            g.profiler = StackSampler(threading.get_ident(), app.config['PROFILE_INTERVAL_MS'] / 1000)
+            g.profiler.start()
+
+    @app.after_request
+    def name_profile_file(response):
+        # Header-triggered profiles end here so the response can name the file
+        if g.get('profile_requested') and 'profile_start' in g:
+            response.headers['X-Profile-File'] = _finish_profile()
+        return response
+
+    @app.teardown_request
+    def stop_profile(exception=None):
+        if 'profile_start' in g:
+            _finish_profile()
+
+    def _finish_profile():
+        profiler = g.pop('profiler')
+        elapsed_ms = (time.perf_counter() - g.pop('profile_start')) * 1000
+        directory = app.config['PROFILE_DIR']
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            name = _write_profile(directory, request.endpoint, elapsed_ms, 'prof', profiler.dump_stats)
+        else:
+            profiler.stop()
+
+            def write(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.collapsed())
+
+            name = _write_profile(directory, request.endpoint, elapsed_ms, 'collapsed', write)
+        with lock:
+            _prune(directory, app.config['PROFILE_MAX_FILES'])
+        return name
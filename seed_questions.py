@@ -1,6 +1,9 @@
 """Seed database with quiz questions from JSON files"""
-from app import app
+from app import create_app
 from db.tables import db, Question
+from db.init_db import ensure_db
+from db.search_index import rebuild_search_index
+from api.question_cache import bump_seed_version
 import json
 import os
 from pathlib import Path
@@ -32,6 +35,8 @@ def load_questions_from_json():
 
 def seed_questions():
     """Add quiz questions from JSON files to the database"""
+    app = create_app()
+    ensure_db(app)
     with app.app_context():
         existing = Question.query.first()
         if existing:
@@ -40,6 +45,7 @@ def seed_questions():
             if response.lower() == 'yes':
                 Question.query.delete()
                 db.session.commit()
+                rebuild_search_index()
                 print("Existing questions cleared.")
             else:
                 print("Skipping seed.")
@@ -62,7 +68,11 @@ def seed_questions():
             
             db.session.add(question)
         
+        # Ids can be reused after a reseed; workers drop their cached payloads
+        bump_seed_version()
         db.session.commit()
+        if rebuild_search_index():
+            print("Search index rebuilt.")
         print(f"Successfully added {len(questions_data)} questions to the database!")
 
 
@@ -0,0 +1,6 @@
+"""Service-layer SQL must not walk whole tables (see benchmarks/check_query_plans.py)"""
+from benchmarks.check_query_plans import find_regressions
+
+
+def test_no_unexpected_full_table_scans():
+    assert find_regressions() == []
@@ -0,0 +1,251 @@
+"""Web page routes"""
+import bleach
+import datetime
+from contextvars import ContextVar
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, session, get_template_attribute
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from markupsafe import Markup
+from api import fragment_cache
+from api.auth_service import authenticate_user, register_user
+from api.profile_service import get_user_profile, update_user_profile, get_activity
+from api.quiz_service import get_next_question, submit_answer, get_question_by_id
+from api.adaptive_service import SELECTION_MODES
+from api.leaderboard_service import get_leaderboard, get_leaderboard_entries, get_user_rank
+from api.services import get_weather_forecast
+from db.tables import User
+from db.config import get_read_session
+
+web_bp = Blueprint('web', __name__)
+
+# Bound to the app in create_app(); limits come from RATELIMIT_* config
+limiter = Limiter(key_func=get_remote_address, storage_uri="memory://")
+
+# Set by asgi.py for requests it already counted against the limits before prefetching
+limits_counted = ContextVar('limits_counted', default=False)
+
+
+@limiter.request_filter
+def _limits_already_counted():
+    return limits_counted.get()
+
+LEADERBOARD_PAGE_SIZE = 50
+
+
+@web_bp.route('/', methods=['GET', 'POST'])
+def home_page():
+    """Home page with weather forecast form"""
+    if request.method == 'GET':
+        return render_template('index.html')
+    
+    city = request.form.get('city', '').strip()
+    city = bleach.clean(city, tags=[], strip=True)
+    force_refresh = request.form.get('force_refresh') == '1'
+    
+    if not city or len(city) > 100:
+        return render_template('index.html', 
+                             error="Please enter a valid city name (1-100 characters).",
+                             city=city)
+    
+    forecast = get_weather_forecast(city, force_refresh=force_refresh)
+    
+    if forecast:
+        return render_template('index.html', forecast=forecast, city=city)
+    else:
+        return render_template('index.html', 
+                             error=f"Could not retrieve weather data for '{city}'",
+                             city=city)
+
+@web_bp.route('/login', methods=['GET', 'POST'])
+@limiter.limit("10 per minute")
+def login_page():
+    """Login page and authentication"""
+    if request.method == 'GET':
+        return render_template('login.html')
+
+    success, error, user = authenticate_user(
+        request.form.get('username', ''),
+        request.form.get('password', '')
+    )
+    
+    if success:
+        return redirect(url_for('web.profile_page'))
+    else:
+        return render_template('login.html', error=error)
+    
+
+@web_bp.route('/register', methods=['GET', 'POST'])
+@limiter.limit("50 per hour")
+def register_page():
+    """Registration page and user creation"""
+    if request.method == 'GET':
+        return render_template('register.html')
+    
+    success, error, user = register_user(
+        request.form.get('username', ''),
+        request.form.get('nickname', ''),
+        request.form.get('password', ''),
+        request.form.get('confirm_password', '')
+    )
+    
+    if success:
+        return render_template('login.html', message='Registration successful! Please login.')
+    else:
+        return render_template('register.html', error=error)
+
+
+@web_bp.route('/profile', methods=['GET', 'POST'])
+def profile_page():
+    """Display and update the profile page for the logged-in user"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for('web.login_page'))
+    
+    message = None
+    error = None
+
+    if request.method == 'POST':
+        success, err = update_user_profile(
+            user_id,
+            request.form.get('nickname', ''),
+            session.get('csrf_token')
+        )
+        
+        if success:
+            message = 'Profile updated successfully!'
+        else:
+            error = err
+    
+    success, err, profile_data = get_user_profile(user_id=user_id)
+    
+    if success:
+        user = User.query.get(user_id)
+        if not user:
+            return redirect(url_for('web.login_page'))
+        
+        return render_template('profile.html', 
+                             user=user, 
+                             average_score=profile_data.get('average_score', 0),
+                             total_quizzes=profile_data.get('total_quizzes', 0),
+                             quizzes=_with_datetimes(profile_data.get('quizzes', [])),
+                             message=message,
+                             error=error)
+    else:
+        return redirect(url_for('web.login_page'))
+
+
+@web_bp.route('/profile/activity')
+def activity_page():
+    """Full quiz history for the logged-in user, one keyset page at a time"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for('web.login_page'))
+    
+    cursor = request.args.get('cursor')
+    success, err, activity = get_activity(user_id, cursor=cursor)
+    if not success:
+        return render_template('activity.html', error=err, cursor=cursor)
+    
+    return render_template('activity.html',
+                         quizzes=_with_datetimes(activity['items']),
+                         cursor=cursor,
+                         next_cursor=activity['next_cursor'])
+
+
+def _with_datetimes(quizzes):
+    """Attempt dicts from the services with their ISO timestamps parsed for display"""
+    return [dict(q, timestamp=datetime.datetime.fromisoformat(q['timestamp'])) for q in quizzes]
+
+
+@web_bp.route('/profile/<nickname>')
+def view_profile(nickname):
+    """View another user's public profile by nickname"""
+    user = get_read_session().query(User).filter_by(nickname=nickname).first()
+    if not user:
+        return render_template('public_profile.html', error='User not found')
+    
+    # Reloaded on a miss: right after an invalidation the card is rendered from the primary
+    profile_card = fragment_cache.get_fragment(
+        ('profile', user.id),
+        lambda: Markup(render_template('_profile_card.html', user=get_read_session().get(User, user.id)))
+    )
+    return render_template('public_profile.html', user=user, profile_card=profile_card)
+
+
+@web_bp.route('/quiz', methods=['GET', 'POST'])
+def quiz_page():
+    """Quiz page - get question and submit answer"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for('web.login_page'))
+    
+    result = None
+    error = None
+    mode = request.args.get('mode', current_app.config['QUIZ_SELECTION_MODE'])
+    if mode not in SELECTION_MODES:
+        mode = 'random'
+    
+    if request.method == 'POST':
+        question_id = request.form.get('question_id')
+        answer = request.form.get('answer', '').strip().lower()
+        
+        if question_id and answer:
+            success, err, result = submit_answer(user_id, int(question_id), answer)
+            if not success:
+                error = err
+    
+    # Check if a specific question ID is requested
+    question_id = request.args.get('id', type=int)
+    if question_id:
+        question = get_question_by_id(question_id)
+        if not question:
+            error = 'Question not found'
+            question = get_next_question(user_id, mode)
+    else:
+        question = get_next_question(user_id, mode)
+    
+    if not question:
+        return render_template('quiz.html', error='No questions available')
+    
+    return render_template('quiz.html', question=question, result=result, error=error, mode=mode)
+
+
+@web_bp.route('/leaderboard')
+def leaderboard_page():
+    """Leaderboard page showing users by score with pagination"""
+    page = request.args.get('page', 1, type=int)
+    
+    pagination = get_leaderboard(page=page, per_page=LEADERBOARD_PAGE_SIZE, include_entries=False)
+    
+    user_rank = None
+    user_id = session.get('user_id')
+    if user_id:
+        user_rank = get_user_rank(user_id)
+    
+    return render_template('leaderboard.html', 
+                         leaderboard_rows=_leaderboard_rows(page, user_id),
+                         pagination=pagination,
+                         user_rank=user_rank)
+
+
+def _leaderboard_rows(page, user_id):
+    """Cached table rows for a leaderboard page; the viewer's own row is rendered live"""
+    leaderboard_row = get_template_attribute('_leaderboard_row.html', 'leaderboard_row')
+    
+    def render():
+        entries = get_leaderboard_entries(page, LEADERBOARD_PAGE_SIZE)
+        fragment_cache.track_leaderboard_page(page, LEADERBOARD_PAGE_SIZE, entries)
+        return [(entry, leaderboard_row(entry, index, False)) for index, entry in enumerate(entries, 1)]
+    
+    rows = fragment_cache.get_fragment(fragment_cache.leaderboard_scope(page, LEADERBOARD_PAGE_SIZE), render)
+    return Markup('\n').join(
+        leaderboard_row(entry, index, True) if entry['user_id'] == user_id else html
+        for index, (entry, html) in enumerate(rows, 1)
+    )
+
+
+@web_bp.route('/logout', methods=['GET'])
+def logout_page():
+    """Logout and clear session"""
+    session.clear()
+    return redirect(url_for('web.login_page'))
\ No newline at end of file